@@ -0,0 +1,7 @@
+"""
+Benchmarks de desempenho dos filtros, ruídos, métricas e do pipeline
+completo, tanto do script (processamento_imagens.py) quanto da aplicação
+web (webapp/image_processor.py).
+
+Uso: python -m benchmarks --help
+"""
@@ -0,0 +1,104 @@
+"""
+Executa os benchmarks, salva os resultados em JSON e compara com o baseline.
+
+Exemplos:
+    python -m benchmarks
+    python -m benchmarks --sizes 256 512 --kernels 3 7 --only filter
+    python -m benchmarks --update-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from benchmarks.suite import build_cases, compare, measure
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks - Filtros Espaciais')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 512, 1024],
+                        help='Lados das imagens quadradas (default: 256 512 1024)')
+    parser.add_argument('--kernels', type=int, nargs='+', default=[3, 5, 7],
+                        help='Tamanhos de kernel dos filtros (default: 3 5 7)')
+    parser.add_argument('--repeat', type=int, default=5, help='Execuções medidas por caso (default: 5)')
+    parser.add_argument('--only', default=None, help='Executa só os casos cujo nome contém este texto')
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'ultimo.json'),
+                        help='Arquivo JSON com os resultados (default: benchmarks/ultimo.json)')
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'baseline.json'),
+                        help='Baseline para comparação (default: benchmarks/baseline.json)')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Grava os resultados como novo baseline em vez de comparar')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Aumento relativo da mediana considerado regressão (default: 0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='Aumento absoluto mínimo (ms) para considerar regressão (default: 1.0)')
+    args = parser.parse_args()
+
+    cases = build_cases(args.sizes, args.kernels)
+    if args.only:
+        cases = [(key, func) for key, func in cases if args.only in key]
+
+    print(f"Executando {len(cases)} caso(s), {args.repeat} repetição(ões) cada...\n")
+    print(f"  {'Caso':60s} {'Mediana':>10s} {'p95':>10s} {'Pico':>10s}")
+
+    results = {}
+    for key, func in cases:
+        result = measure(func, repeat=args.repeat)
+        results[key] = result
+        print(f"  {key:60s} {result['median_ms']:8.2f}ms {result['p95_ms']:8.2f}ms "
+              f"{result['peak_kb'] / 1024:8.1f}MB")
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sizes': args.sizes,
+            'kernels': args.kernels,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+    output = args.baseline if args.update_baseline else args.output
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Resultados salvos em: {output}")
+
+    if args.update_baseline:
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠ Baseline não encontrado ({args.baseline}); use --update-baseline para criá-lo")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+    compared = sum(1 for key in results if key in baseline['results'])
+    print(f"\nComparação com o baseline ({compared} caso(s) em comum, limite +{args.threshold:.0%}):")
+    if not regressions:
+        print("  ✓ Nenhuma regressão")
+        return 0
+
+    for key, base_ms, current_ms, ratio in regressions:
+        print(f"  ✗ {key}: {base_ms:.2f}ms -> {current_ms:.2f}ms ({ratio:.2f}x)")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Casos de benchmark e medição de tempo e memória.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# A aplicação web usa imports planos (executada de dentro de webapp/)
+for path in (ROOT, os.path.join(ROOT, 'webapp')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import processamento_imagens as cli  # noqa: E402
+from gerar_imagens_teste import criar_imagem_circulos  # noqa: E402
+from image_processor import ImageProcessor  # noqa: E402
+
+
+FILTER_FUNCTIONS = ['apply_mean_filter', 'apply_gaussian_filter', 'apply_median_filter', 'apply_mode_filter']
+METRIC_FUNCTIONS = ['calculate_mse', 'calculate_psnr', 'calculate_ssim']
+
+
+def case_key(name, params):
+    """Identificador estável de um caso, usado para comparar com o baseline."""
+    return f"{name}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def build_cases(sizes, kernels):
+    """
+    Monta a matriz de casos (tamanho de imagem x tamanho de kernel) com
+    imagens de gerar_imagens_teste.py. Retorna uma lista de
+    (chave, função sem argumentos).
+    """
+    cases = []
+
+    def add(name, params, func, *args, **kwargs):
+        cases.append((case_key(name, params), lambda: func(*args, **kwargs)))
+
+    processor = ImageProcessor()
+
+    for size in sizes:
+        original = criar_imagem_circulos((size, size), num_circulos=20, seed=42)
+        noisy = cli.add_salt_pepper_noise(original, 0.02, 0.02, seed=0)
+        filtered = cli.apply_median_filter(noisy, 3)
+        all_filtered = {f'{func}_{k}': getattr(cli, func)(noisy, k) for func in FILTER_FUNCTIONS for k in (3, 7)}
+        params = {'size': size}
+
+        for prefix, module in (('cli', cli), ('app', ImageProcessor)):
+            add(f'{prefix}.add_salt_pepper_noise', params, module.add_salt_pepper_noise, original,
+                0.02, 0.02, seed=0)
+            add(f'{prefix}.add_gaussian_noise', params, module.add_gaussian_noise, original, 0, 25, seed=0)
+
+            for kernel_size in kernels:
+                for func in FILTER_FUNCTIONS:
+                    add(f'{prefix}.{func}', {**params, 'kernel': kernel_size}, getattr(module, func),
+                        noisy, kernel_size)
+
+            for func in METRIC_FUNCTIONS:
+                add(f'{prefix}.{func}', params, getattr(module, func), original, filtered)
+
+        add('cli.compute_metrics', params, cli.compute_metrics, original, all_filtered)
+        # Média e gaussiano encadeados: fundidos numa passada e passo a passo
+        chain = (('mean', 5), ('gaussian', 5))
+        steps = [(cli.FILTER_REGISTRY[key][1], kernel_size, ()) for key, kernel_size in chain]
+        add('cli.run_pipeline', {**params, 'chain': 'mean5>gaussian5', 'fused': 1}, cli.run_pipeline,
+            cli.compile_pipeline(chain), noisy)
+        add('cli.run_pipeline', {**params, 'chain': 'mean5>gaussian5', 'fused': 0}, cli.run_pipeline, steps, noisy)
+        add('cli.process_image_with_filters', params, cli.process_image_with_filters, original, noisy,
+            verbose=False)
+
+        add('app.process_image', params, processor.process_image, original, noisy)
+        add('app.encode_png', params, processor.encode_png, noisy)
+        add('app.image_to_base64', params, processor.image_to_base64, noisy)
+
+    return cases
+
+
+def measure(func, repeat=5, warmup=1):
+    """
+    Mede uma função: mediana, p95 e mínimo do tempo (ms) em `repeat`
+    execuções, e o pico de memória alocada (KB) numa execução à parte com
+    tracemalloc, para não distorcer os tempos. O pico inclui os arrays do
+    NumPy (e as saídas do OpenCV), mas não buffers internos do OpenCV.
+    """
+    for _ in range(warmup):
+        func()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'median_ms': float(np.median(times)),
+        'p95_ms': float(np.percentile(times, 95)),
+        'min_ms': float(min(times)),
+        'peak_kb': peak / 1024,
+        'repeat': repeat,
+    }
+
+
+def compare(current, baseline, threshold=0.2, min_delta_ms=1.0):
+    """
+    Compara as medianas com o baseline. Uma regressão é um caso mais lento
+    que o baseline por mais de `threshold` (fração) e por mais de
+    `min_delta_ms`, que evita falsos alarmes em funções muito rápidas.
+    """
+    regressions = []
+    for key, result in current['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        delta = result['median_ms'] - base['median_ms']
+        ratio = result['median_ms'] / max(base['median_ms'], 1e-9)
+        if ratio > 1 + threshold and delta > min_delta_ms:
+            regressions.append((key, base['median_ms'], result['median_ms'], ratio))
+    return regressions
@@ -8,146 +8,683 @@ Script alternativo para execução sem Jupyter Notebook
 
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import ndimage
-from scipy.stats import mode
-import pandas as pd
 import os
+import sys
 import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.util
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Módulos compartilhados com a aplicação web, que usa imports planos
+# (executada de dentro de webapp/): os filtros, o registro, a leitura das
+# especificações de pipeline, o planejamento e a execução dos pipelines
+# (filters.py), a borda e a execução em blocos (tiling.py), o ruído
+# (noise.py), as métricas (metrics.py), o cache de resultados e os tempos
+# por etapa (timing.py)
+WEBAPP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp')
+if WEBAPP_DIR not in sys.path:
+    sys.path.insert(0, WEBAPP_DIR)
+
+from filters import (  # noqa: E402
+    DEFAULT_FILTER_SPEC, FILTER_REGISTRY, MAX_KERNEL_SIZE, apply_gaussian_filter, apply_mean_filter,
+    apply_median_filter, apply_mode_filter, compile_pipeline, parse_pipeline_spec, plan_pipelines, run_pipeline,
+    shared_padding,
+)
+from metrics import CHUNK_PIXELS as METRICS_CHUNK_PIXELS, compute_metrics, psnr_from_mse  # noqa: E402
+from noise import add_gaussian_noise, add_salt_pepper_noise  # noqa: E402
+from result_cache import ResultCache, make_cache_key  # noqa: E402
+from tiling import FILTER_BORDERS, TileExecutor  # noqa: E402
+from timing import NO_TIMER, StageTimer  # noqa: E402
+
+# matplotlib e pandas são importados só quando usados (figuras e tabelas),
+# o que reduz o tempo de inicialização; veja --profile-startup
+LAZY_MODULES = ('pandas', 'matplotlib.pyplot')
+
+
+def _pyplot():
+    """Importa o matplotlib (backend Agg) na primeira figura."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
 
 # =============================================================================
-# FUNÇÕES DE GERAÇÃO DE RUÍDO
+# FUNÇÕES DE AVALIAÇÃO QUANTITATIVA
 # =============================================================================
 
-def add_salt_pepper_noise(image, salt_prob=0.01, pepper_prob=0.01):
-    """Adiciona ruído sal e pimenta à imagem."""
-    noisy = image.copy()
+# MSE, PSNR e SSIM de várias imagens numa única passada: compute_metrics,
+# de webapp/metrics.py; as funções abaixo avaliam uma imagem só
 
-    # Ruído sal (branco)
-    salt_mask = np.random.random(image.shape) < salt_prob
-    noisy[salt_mask] = 255
+def calculate_mse(original, filtered):
+    """Calcula o Mean Squared Error (MSE) entre duas imagens."""
+    return compute_metrics(original, {'filtrada': filtered}, ssim=False)['filtrada']['mse']
 
-    # Ruído pimenta (preto)
-    pepper_mask = np.random.random(image.shape) < pepper_prob
-    noisy[pepper_mask] = 0
 
-    return noisy
+def calculate_psnr(original, filtered):
+    """Calcula o Peak Signal-to-Noise Ratio (PSNR) entre duas imagens."""
+    return psnr_from_mse(calculate_mse(original, filtered))
 
 
-def add_gaussian_noise(image, mean=0, sigma=25):
-    """Adiciona ruído gaussiano à imagem."""
-    gaussian = np.random.normal(mean, sigma, image.shape)
-    noisy = image + gaussian
-    noisy = np.clip(noisy, 0, 255).astype(np.uint8)
-    return noisy
+def calculate_ssim(original, filtered):
+    """Calcula o Structural Similarity Index (SSIM) entre duas imagens."""
+    return compute_metrics(original, {'filtrada': filtered})['filtrada']['ssim']
 
 
 # =============================================================================
-# FUNÇÕES DE FILTROS ESPACIAIS
+# PROCESSAMENTO PRINCIPAL
 # =============================================================================
 
-def apply_mean_filter(image, kernel_size=3):
-    """Aplica filtro de média."""
-    return cv2.blur(image, (kernel_size, kernel_size))
+# Filtros avaliados por padrão (DEFAULT_FILTER_SPEC), do mais rápido ao
+# mais lento; --filters aceita outra especificação: [(nome, passos)]
+FILTERS = parse_pipeline_spec(DEFAULT_FILTER_SPEC)
 
 
-def apply_gaussian_filter(image, kernel_size=3):
-    """Aplica filtro gaussiano."""
-    sigma = 0.3 * ((kernel_size - 1) * 0.5 - 1) + 0.8
-    return cv2.GaussianBlur(image, (kernel_size, kernel_size), sigma)
+def filter_filename(filter_name):
+    """
+    Nome de arquivo (sem extensão) das saídas de um filtro: 'Média 3x3' ->
+    'média_33', 'Mediana 3x3 > Gaussiano 5x5' -> 'mediana_33__gaussiano_55'.
+    """
+    return filter_name.lower().replace(' > ', '__').replace(' ', '_').replace('x', '')
 
 
-def apply_median_filter(image, kernel_size=3):
-    """Aplica filtro de mediana."""
-    return cv2.medianBlur(image, kernel_size)
+def process_image_with_filters(original, noisy, tiles=None, cache=None, cache_key=None, verbose=True, timer=NO_TIMER,
+                               filters=None):
+    """
+    Processa uma imagem aplicando os filtros (default: FILTERS) e calcula as
+    métricas.
 
+    Com um TileExecutor em `tiles`, cada filtro é executado em blocos
+    paralelos.
+    Com cache e chave, resultados já calculados são reaproveitados.
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
+    results = {}
+    filters = filters or FILTERS
+
+    log("  Aplicando filtros:")
+    filtered_images = {}
+    # Saída de cada sequência de passos, para os pipelines que a estendem
+    outputs = {}
+    pending = []
+
+    for filter_name, steps in filters:
+        if cache is not None and cache_key is not None:
+            cached = cache.get(f"{cache_key}|{filter_name}")
+            if cached is not None:
+                results[filter_name] = cached
+                outputs[steps] = cached['image']
+                log(f"    - {filter_name}... OK (cache)")
+                continue
+        pending.append((filter_name, steps))
 
-def apply_mode_filter(image, kernel_size=3):
-    """Aplica filtro de moda."""
-    pad = kernel_size // 2
-    padded = np.pad(image, pad, mode='edge')
-    output = np.zeros_like(image)
+    plans = plan_pipelines(pending, outputs)
+    # Buffers dos resultados intermediários, comuns a todos os pipelines, e
+    # a borda expandida uma vez para os que começam da imagem ruidosa
+    scratch = [None, None]
+    padded = None
+    if tiles is not None and tiles.splits(noisy):
+        padded = shared_padding([operations for _, _, start, operations in plans if start == 0], noisy)
 
-    for i in range(image.shape[0]):
-        for j in range(image.shape[1]):
-            window = padded[i:i+kernel_size, j:j+kernel_size]
-            output[i, j] = mode(window, axis=None, keepdims=False)[0]
+    for filter_name, steps, start, operations in plans:
+        log(f"    - {filter_name}...", end=' ', flush=True)
 
-    return output.astype(np.uint8)
+        # Aplicar filtro
+        with timer.stage(f'filter:{filter_name}') as stage:
+            if start:
+                image = run_pipeline(operations, outputs[steps[:start]], tiles, scratch)
+            else:
+                image = run_pipeline(operations, noisy, tiles, scratch, padded)
+            outputs[steps] = filtered_images[filter_name] = image
+            stage.nbytes = image.nbytes
+        log("OK")
+
+    # Calcular métricas de todos os filtros numa única passada
+    metrics = {}
+    if filtered_images:
+        with timer.stage('metrics'):
+            metrics = compute_metrics(original, filtered_images)
+
+    for filter_name, filtered in filtered_images.items():
+        results[filter_name] = {'image': filtered, **metrics[filter_name]}
+
+        if cache is not None and cache_key is not None:
+            cache.put(f"{cache_key}|{filter_name}", results[filter_name])
+
+    # Manter a ordem dos filtros
+    return {filter_name: results[filter_name] for filter_name, _ in filters}
+
+
+# Parâmetros do ruído usados pelo script
+NOISE_PARAMS = {
+    'salt_pepper': {'salt_prob': 0.02, 'pepper_prob': 0.02},
+    'gaussian': {'mean': 0, 'sigma': 25},
+}
+
+
+def generate_noisy_image(image, noise_type, seed=None, cache=None, cache_key=None, timer=NO_TIMER):
+    """Gera a imagem ruidosa, reaproveitando o cache quando possível."""
+    if cache is not None and cache_key is not None:
+        cached = cache.get(f"{cache_key}|noisy")
+        if cached is not None:
+            return cached['image']
+
+    with timer.stage('noise') as stage:
+        if noise_type == 'salt_pepper':
+            noisy = add_salt_pepper_noise(image, seed=seed, **NOISE_PARAMS[noise_type])
+        else:
+            noisy = add_gaussian_noise(image, seed=seed, **NOISE_PARAMS[noise_type])
+        stage.nbytes = noisy.nbytes
+
+    if cache is not None and cache_key is not None:
+        cache.put(f"{cache_key}|noisy", {'image': noisy})
+    return noisy
+
+
+def run_image_pipeline(original, noise_type, seed, cache=None, use_cache=False, tiles=None, verbose=True,
+                       timer=NO_TIMER, filters=None):
+    """Executa ruído, filtros e métricas de uma imagem."""
+    cache_key = make_cache_key(original, noise_type, NOISE_PARAMS[noise_type], seed) if use_cache else None
+    noisy = generate_noisy_image(original, noise_type, seed, cache, cache_key, timer=timer)
+    results = process_image_with_filters(original, noisy, tiles=tiles, cache=cache, cache_key=cache_key,
+                                         verbose=verbose, timer=timer, filters=filters)
+    return noisy, results
 
 
 # =============================================================================
-# FUNÇÕES DE AVALIAÇÃO QUANTITATIVA
+# PROCESSAMENTO FORA DA MEMÓRIA (MEMMAP)
 # =============================================================================
 
-def calculate_mse(original, filtered):
-    """Calcula o Mean Squared Error (MSE) entre duas imagens."""
-    mse = np.mean((original.astype(float) - filtered.astype(float)) ** 2)
-    return mse
+def load_as_memmap(path, npy_path, timer=NO_TIMER):
+    """
+    Abre a imagem de entrada como np.memmap em tons de cinza.
+
+    Um .npy 2D uint8 é mapeado diretamente, sem cópia. Qualquer outra
+    entrada (imagem ou .npy colorido) é copiada em faixas de linhas para
+    `npy_path`; imagens comprimidas ainda precisam ser decodificadas
+    inteiras (já em tons de cinza) pelo OpenCV (veja
+    OPENCV_IO_MAX_IMAGE_PIXELS para imagens muito grandes). Retorna None se
+    o arquivo não puder ser lido.
+    """
+    with timer.stage('decode') as stage:
+        if path.lower().endswith('.npy'):
+            source = np.load(path, mmap_mode='r')
+            if source.ndim == 2 and source.dtype == np.uint8:
+                return source
+        else:
+            source = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if source is None:
+                return None
+
+        if source.ndim not in (2, 3):
+            return None
+        gray = np.lib.format.open_memmap(npy_path, mode='w+', dtype=np.uint8, shape=source.shape[:2])
+        rows = max(1, METRICS_CHUNK_PIXELS // max(1, source.shape[1]))
+        for y in range(0, source.shape[0], rows):
+            band = np.asarray(source[y:y+rows])
+            if band.ndim == 3:
+                band = cv2.cvtColor(band.astype(np.uint8), cv2.COLOR_BGR2GRAY)
+            gray[y:y+rows] = band
+        gray.flush()
+        stage.nbytes = gray.nbytes
+        return gray
+
+
+def _filter_padded_band(filter_func, band, kernel_size, top, bottom, halo, *args):
+    """Completa a borda de uma faixa de linhas, filtra e descarta o halo."""
+    padded = np.pad(band, ((top, bottom), (halo, halo)), mode=FILTER_BORDERS[filter_func])
+    filtered = filter_func(padded, kernel_size, *args)
+    return filtered[halo:filtered.shape[0]-halo, halo:filtered.shape[1]-halo]
+
+
+def filter_to_memmap(filter_func, source, output, kernel_size, *args, tile_rows=512, pool=None):
+    """
+    Aplica um filtro em faixas de `tile_rows` linhas lidas de `source` e
+    escritas em `output` (ambos podem ser np.memmap); `args` vão para o
+    filtro depois do tamanho do kernel.
+
+    Cada faixa leva halo = kernel_size // 2 linhas vizinhas; nas bordas da
+    imagem o halo que falta é completado com a mesma borda do filtro, então
+    o resultado é idêntico ao da imagem inteira. Com `pool`, no máximo duas
+    faixas por worker ficam em memória ao mesmo tempo.
+    """
+    height = source.shape[0]
+    halo = kernel_size // 2
+    tile_rows = max(tile_rows, halo + 1)
+    max_pending = 2 * getattr(pool, '_max_workers', 1)
+    pending = deque()
+
+    def collect():
+        y, y_end, result = pending.popleft()
+        output[y:y_end] = result.result() if pool is not None else result
+
+    for y in range(0, height, tile_rows):
+        y_end = min(y + tile_rows, height)
+        top = max(0, y - halo)
+        bottom = min(height, y_end + halo)
+        band_args = (filter_func, np.asarray(source[top:bottom]), kernel_size,
+                     halo - (y - top), halo - (bottom - y_end), halo, *args)
+        if pool is not None:
+            pending.append((y, y_end, pool.submit(_filter_padded_band, *band_args)))
+        else:
+            pending.append((y, y_end, _filter_padded_band(*band_args)))
+        if len(pending) >= max_pending:
+            collect()
+    while pending:
+        collect()
 
+    if isinstance(output, np.memmap):
+        output.flush()
+    return output
 
-def calculate_psnr(original, filtered):
-    """Calcula o Peak Signal-to-Noise Ratio (PSNR) entre duas imagens."""
-    mse = calculate_mse(original, filtered)
-    if mse == 0:
-        return float('inf')
 
-    max_pixel = 255.0
-    psnr = 20 * np.log10(max_pixel / np.sqrt(mse))
-    return psnr
+def process_image_out_of_core(original, noise_type, seed, img_folder, tile_rows=512, pool=None, timer=NO_TIMER,
+                              filters=None):
+    """
+    Versão fora da memória de run_image_pipeline: a imagem ruidosa e as
+    filtradas são gravadas como .npy mapeados em `img_folder` e as métricas
+    são acumuladas por blocos de linhas, com o mesmo resultado do
+    processamento em memória.
+    """
+    def open_output(name):
+        return np.lib.format.open_memmap(f'{img_folder}/{name}.npy', mode='w+', dtype=np.uint8,
+                                         shape=original.shape)
+
+    with timer.stage('noise') as stage:
+        noisy = open_output('ruidosa')
+        if noise_type == 'salt_pepper':
+            add_salt_pepper_noise(original, seed=seed, out=noisy, **NOISE_PARAMS[noise_type])
+        else:
+            add_gaussian_noise(original, seed=seed, out=noisy, **NOISE_PARAMS[noise_type])
+        noisy.flush()
+        stage.nbytes = noisy.nbytes
+
+    print("  Aplicando filtros (fora da memória):")
+    filtered_images = {}
+    outputs = {}
+    # Intermediários dos pipelines encadeados, em dois .npy reaproveitados
+    scratch = [None, None]
+    for filter_name, steps, start, operations in plan_pipelines(filters or FILTERS):
+        with timer.stage(f'filter:{filter_name}') as stage:
+            output = open_output(filter_filename(filter_name))
+            current = outputs[steps[:start]] if start else noisy
+            for i, (filter_func, kernel_size, args) in enumerate(operations):
+                target = output
+                if i < len(operations) - 1:
+                    if scratch[i % 2] is None:
+                        scratch[i % 2] = open_output(f'.intermediario_{i % 2}')
+                    target = scratch[i % 2]
+                current = filter_to_memmap(filter_func, current, target, kernel_size, *args,
+                                           tile_rows=tile_rows, pool=pool)
+            outputs[steps] = filtered_images[filter_name] = output
+            stage.nbytes = output.nbytes
+        print(f"    ✓ {filter_name}")
+
+    # Os .npy intermediários não fazem parte das saídas
+    for buffer in scratch:
+        if buffer is not None:
+            os.remove(buffer.filename)
+
+    with timer.stage('metrics'):
+        metrics = compute_metrics(original, filtered_images)
+
+    results = {name: {'image': image, **metrics[name]} for name, image in filtered_images.items()}
+    return noisy, results
+
+
+def iter_out_of_core_results(paths, noise_type, base_seed, output_dir, tile_rows=512, tile_workers=1,
+                             tile_processes=False, timings=False, filters=None):
+    """
+    Como iter_pipeline_results, mas cada imagem é processada em disco
+    (process_image_out_of_core) em {output_dir}/imagem_N/. Não usa cache.
+    """
+    pool = None
+    if tile_workers > 1:
+        pool_cls = ProcessPoolExecutor if tile_processes else ThreadPoolExecutor
+        pool = pool_cls(max_workers=tile_workers)
+
+    try:
+        i = 0
+        for img_path in paths:
+            if not os.path.exists(img_path):
+                print(f"  ⚠️ Não encontrado: {img_path}")
+                continue
+            img_folder = f'{output_dir}/imagem_{i+1}'
+            os.makedirs(img_folder, exist_ok=True)
+            timer = StageTimer() if timings else NO_TIMER
+            original = load_as_memmap(img_path, f'{img_folder}/original.npy', timer=timer)
+            if original is None:
+                print(f"  ⚠️ Erro ao carregar: {img_path}")
+                continue
+
+            print(f"\nImagem {i+1} ({img_path}):")
+            noisy, results = process_image_out_of_core(original, noise_type, base_seed + i, img_folder,
+                                                        tile_rows=tile_rows, pool=pool, timer=timer,
+                                                        filters=filters)
+            yield i, img_path, original, noisy, results, list(timer.stages)
+            i += 1
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
 
 # =============================================================================
-# PROCESSAMENTO PRINCIPAL
+# GRAVAÇÃO DE IMAGENS EM SEGUNDO PLANO
 # =============================================================================
 
-def process_image_with_filters(original, noisy):
+# Formatos de saída das imagens processadas
+IMAGE_FORMATS = ('png', 'webp', 'npy')
+
+
+class ImageWriter:
     """
-    Processa uma imagem aplicando todos os filtros e calcula as métricas.
+    Grava imagens em segundo plano num pool de threads, sem bloquear o
+    processamento. A fila é limitada: `write` espera quando há `max_pending`
+    imagens pendentes, então a memória não cresce se o disco for lento.
+
+    Formatos: PNG (nível de compressão 0-9; None usa o padrão do OpenCV),
+    WebP sem perdas ou .npy (sem compressão).
     """
-    results = {}
 
-    filters = [
-        ('Média 3x3', apply_mean_filter, 3),
-        ('Média 7x7', apply_mean_filter, 7),
-        ('Gaussiano 3x3', apply_gaussian_filter, 3),
-        ('Gaussiano 7x7', apply_gaussian_filter, 7),
-        ('Mediana 3x3', apply_median_filter, 3),
-        ('Mediana 7x7', apply_median_filter, 7),
-        ('Moda 3x3', apply_mode_filter, 3),
-        ('Moda 7x7', apply_mode_filter, 7),
-    ]
-
-    print("  Aplicando filtros:")
-    for filter_name, filter_func, kernel_size in filters:
-        print(f"    - {filter_name}...", end=' ', flush=True)
+    def __init__(self, image_format='png', png_compression=None, threads=2, max_pending=None):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Formato de imagem inválido: {image_format}")
+        self.image_format = image_format
+        self.png_compression = png_compression
+        self.files_written = 0
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+        self._slots = threading.BoundedSemaphore(max_pending or 4 * threads)
+        self._lock = threading.Lock()
+        self._error = None
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+
+    def write(self, path, image):
+        """Agenda a gravação; `path` não leva extensão."""
+        if self._error is not None:
+            raise self._error
+        self._slots.acquire()
+        future = self._pool.submit(self._write, f"{path}.{self.image_format}", image)
+        future.add_done_callback(self._done)
+
+    def close(self):
+        """Espera as gravações pendentes e relança o primeiro erro, se houver."""
+        self._pool.shutdown(wait=True)
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, path, image):
+        start = time.perf_counter()
+        if self.image_format == 'npy':
+            np.save(path, image)
+        else:
+            if self.image_format == 'png':
+                params = [] if self.png_compression is None else [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+            else:
+                # Qualidade acima de 100 ativa o modo sem perdas do WebP
+                params = [cv2.IMWRITE_WEBP_QUALITY, 101]
+            ok, encoded = cv2.imencode(f'.{self.image_format}', image, params)
+            if not ok:
+                raise IOError(f"Falha ao codificar {path}")
+            with open(path, 'wb') as f:
+                f.write(encoded.data)
+        size = os.path.getsize(path)
+        with self._lock:
+            self.files_written += 1
+            self.bytes_written += size
+            self.write_seconds += time.perf_counter() - start
+
+    def _done(self, future):
+        self._slots.release()
+        error = future.exception()
+        if error is not None and self._error is None:
+            self._error = error
+
+
+def save_processed_images(writer, output_dir, img_idx, original, noisy, results, skip_filtered=False):
+    """Agenda a gravação de original, ruidosa e imagens filtradas de uma imagem."""
+    img_folder = f'{output_dir}/imagem_{img_idx+1}'
+    os.makedirs(img_folder, exist_ok=True)
+
+    writer.write(f'{img_folder}/original', original)
+    writer.write(f'{img_folder}/ruidosa', noisy)
+    if skip_filtered:
+        return img_folder, 2
+
+    for filter_name, data in results.items():
+        writer.write(f'{img_folder}/{filter_filename(filter_name)}', data['image'])
+
+    return img_folder, len(results) + 2
+
+
+# Estado de cada processo do pool de imagens (--workers)
+_worker_state = {}
+
+
+def _init_image_worker(cache_max_bytes, cache_dir, tile_workers, tile_processes, filters=None):
+    """Cria o cache e o pool de blocos de um processo do pool de imagens."""
+    _worker_state['cache'] = ResultCache(cache_max_bytes, disk_dir=cache_dir, disk_max_bytes=cache_max_bytes)
+    _worker_state['filters'] = filters
+    _worker_state['tiles'] = TileExecutor(workers=tile_workers, use_processes=tile_processes)
+    # O pool de imagens encerra este processo sem passar pelo atexit;
+    # os finalizadores do multiprocessing rodam antes de ele esperar os
+    # processos filhos. Prioridade acima da das filas (10), que ainda
+    # precisam entregar o aviso de encerramento aos processos de blocos
+    multiprocessing.util.Finalize(None, _worker_state['tiles'].close, exitpriority=100)
+
+
+def _run_image_worker(original, noise_type, seed, use_cache, timings=False):
+    """Pipeline completo de uma imagem num processo do pool."""
+    cache = _worker_state['cache']
+    timer = StageTimer() if timings else NO_TIMER
+    before = (cache.hits, cache.disk_hits, cache.misses)
+    noisy, results = run_image_pipeline(original, noise_type, seed, cache=cache, use_cache=use_cache,
+                                        tiles=_worker_state['tiles'], verbose=False, timer=timer,
+                                        filters=_worker_state['filters'])
+    after = (cache.hits, cache.disk_hits, cache.misses)
+    return noisy, results, tuple(a - b for a, b in zip(after, before)), list(timer.stages)
+
 
-        # Aplicar filtro
-        filtered = filter_func(noisy, kernel_size)
+# =============================================================================
+# PIPELINE EM STREAMING
+# =============================================================================
+
+# Extensões aceitas ao listar um diretório de entrada
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+def find_input_images(input_dir, pattern=None):
+    """Lista, em ordem alfabética, as imagens de um diretório (opcionalmente filtradas por um padrão glob)."""
+    if pattern:
+        paths = glob.glob(os.path.join(input_dir, pattern))
+    else:
+        paths = [os.path.join(input_dir, name) for name in os.listdir(input_dir)
+                 if name.lower().endswith(IMAGE_EXTENSIONS)]
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def iter_input_images(paths, timings=False):
+    """
+    Carrega as imagens uma a uma, em tons de cinza, ignorando as inválidas.
+    Produz (caminho, imagem, timer); com `timings` o timer já traz a etapa
+    de decodificação e segue com a imagem pelo pipeline.
+    """
+    for img_path in paths:
+        if not os.path.exists(img_path):
+            print(f"  ⚠️ Não encontrado: {img_path}")
+            continue
+        timer = StageTimer() if timings else NO_TIMER
+        with timer.stage('decode') as stage:
+            # Decodificação direta em tons de cinza: sem a imagem BGR de
+            # 3 canais nem a passada extra do cvtColor
+            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                stage.nbytes = img.nbytes
+        if img is None:
+            print(f"  ⚠️ Erro ao carregar: {img_path}")
+            continue
+        yield img_path, img, timer
+
+
+def iter_pipeline_results(images, noise_type, base_seed, use_cache, workers=1, tile_workers=1,
+                          tile_processes=False, cache_max_bytes=0, cache_dir=None, cache_stats=None, filters=None):
+    """
+    Processa as imagens à medida que são carregadas e produz, na ordem de
+    entrada, (índice, caminho, original, ruidosa, resultados, etapas).
+
+    A imagem N usa a seed base_seed + N - 1. Com workers > 1, no máximo
+    2 imagens por worker ficam em andamento, então a memória não cresce com
+    o número de imagens.
+    """
+    if cache_stats is None:
+        cache_stats = {}
+    for key in ('hits', 'disk_hits', 'misses'):
+        cache_stats.setdefault(key, 0)
+
+    if workers > 1:
+        initargs = (cache_max_bytes, cache_dir, tile_workers, tile_processes, filters)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_image_worker,
+                                 initargs=initargs) as image_pool:
+            pending = deque()
+
+            def collect():
+                i, img_path, original, timer, future = pending.popleft()
+                noisy, results, (hits, disk_hits, misses), stages = future.result()
+                cache_stats['hits'] += hits
+                cache_stats['disk_hits'] += disk_hits
+                cache_stats['misses'] += misses
+                return i, img_path, original, noisy, results, list(timer.stages) + stages
+
+            for i, (img_path, original, timer) in enumerate(images):
+                future = image_pool.submit(_run_image_worker, original, noise_type, base_seed + i, use_cache,
+                                           timer is not NO_TIMER)
+                pending.append((i, img_path, original, timer, future))
+                if len(pending) >= 2 * workers:
+                    yield collect()
+            while pending:
+                yield collect()
+        return
+
+    cache = ResultCache(cache_max_bytes, disk_dir=cache_dir, disk_max_bytes=cache_max_bytes)
+    tiles = TileExecutor(workers=tile_workers, use_processes=tile_processes)
+
+    try:
+        for i, (img_path, original, timer) in enumerate(images):
+            print(f"\nImagem {i+1} ({img_path}):")
+            noisy, results = run_image_pipeline(original, noise_type, base_seed + i, cache=cache,
+                                                use_cache=use_cache, tiles=tiles, timer=timer, filters=filters)
+            yield i, img_path, original, noisy, results, list(timer.stages)
+    finally:
+        tiles.close()
+        cache_stats['hits'] += cache.hits
+        cache_stats['disk_hits'] += cache.disk_hits
+        cache_stats['misses'] += cache.misses
+
+
+class MetricsAccumulator:
+    """Soma das métricas por filtro, acumulada imagem a imagem, para as médias."""
 
-        # Calcular métricas
-        mse = calculate_mse(original, filtered)
-        psnr = calculate_psnr(original, filtered)
+    def __init__(self):
+        self.count = 0
+        self.sums = {}
 
-        results[filter_name] = {
-            'image': filtered,
-            'mse': mse,
-            'psnr': psnr
+    def add(self, results):
+        self.count += 1
+        for filter_name, data in results.items():
+            sums = self.sums.setdefault(filter_name, {'mse': 0.0, 'psnr': 0.0, 'ssim': 0.0})
+            for metric in sums:
+                sums[metric] += data[metric]
+
+    def means(self):
+        return {filter_name: {metric: total / self.count for metric, total in sums.items()}
+                for filter_name, sums in self.sums.items()}
+
+
+def save_metrics_csv(results, csv_path, stages=None):
+    """
+    Salva a tabela de métricas de uma imagem. Com `stages` (--timings), cada
+    filtro ganha o tempo e os bytes alocados (vazios se veio do cache) e as
+    demais etapas entram como linhas "Etapa: <nome>" sem métricas.
+    """
+    import pandas as pd
+
+    stage_times = {name: (ms, nbytes) for name, ms, nbytes in stages or ()}
+    data = []
+    for filter_name, metrics in results.items():
+        row = {
+            'Filtro': filter_name,
+            'MSE': f"{metrics['mse']:.4f}",
+            'PSNR (dB)': f"{metrics['psnr']:.4f}",
+            'SSIM': f"{metrics['ssim']:.4f}"
         }
+        if stages is not None:
+            ms, nbytes = stage_times.pop(f'filter:{filter_name}', ('', ''))
+            row['Tempo (ms)'] = f"{ms:.3f}" if ms != '' else ''
+            row['Alocado (bytes)'] = nbytes
+        data.append(row)
+
+    for name, (ms, nbytes) in stage_times.items():
+        data.append({'Filtro': f'Etapa: {name}', 'MSE': '', 'PSNR (dB)': '', 'SSIM': '',
+                     'Tempo (ms)': f"{ms:.3f}", 'Alocado (bytes)': nbytes})
+    pd.DataFrame(data).to_csv(csv_path, index=False)
 
-        print("OK")
 
-    return results
+# =============================================================================
+# FIGURAS
+# =============================================================================
 
+# Filtros exibidos na figura de comparação do relatório
+REPORT_FILTERS = ['Média 3x3', 'Média 7x7', 'Gaussiano 7x7', 'Mediana 3x3']
 
-def save_comparison_figures(original_images, noisy_images, all_results, noise_type, output_dir):
-    """Gera e salva figuras comparativas."""
+# Incrementado quando o desenho das figuras muda, forçando a regeração
+FIGURES_VERSION = 1
+# Impressões digitais das figuras já geradas no diretório de saída
+FIGURES_MANIFEST = '.figuras.json'
+
+
+def plot_report_figure(path, img_idx, original, noisy, results, noise_type):
+    """Figura de comparação do relatório de uma imagem."""
+    plt = _pyplot()
+    fig, axes = plt.subplots(2, 3, figsize=(15, 10))
+    axes = axes.flatten()
+
+    # Original
+    axes[0].imshow(original, cmap='gray', vmin=0, vmax=255)
+    axes[0].set_title('Original', fontsize=14, fontweight='bold')
+    axes[0].axis('off')
+
+    # Ruidosa
+    axes[1].imshow(noisy, cmap='gray', vmin=0, vmax=255)
+    axes[1].set_title(f'Com Ruído ({noise_type})', fontsize=14, fontweight='bold')
+    axes[1].axis('off')
+
+    # Filtros selecionados (report_figure_args)
+    for i, (filter_name, data) in enumerate(results.items()):
+        axes[i+2].imshow(data['image'], cmap='gray', vmin=0, vmax=255)
+        axes[i+2].set_title(f"{filter_name}\nPSNR: {data['psnr']:.2f} dB | MSE: {data['mse']:.2f}", fontsize=12)
+        axes[i+2].axis('off')
+
+    plt.suptitle(f'Comparação Visual - Imagem {img_idx+1}', fontsize=16, fontweight='bold')
+    plt.tight_layout()
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close()
 
-    print("\nGerando figuras comparativas...")
 
-    # Figura 1: Original vs Ruidosa
-    print("  - Comparação Original vs Ruidosa...", end=' ', flush=True)
+def plot_noise_comparison(path, original_images, noisy_images, noise_type):
+    """Figura Original vs Ruidosa de todas as imagens."""
+    plt = _pyplot()
     fig, axes = plt.subplots(len(original_images), 2, figsize=(12, 4*len(original_images)))
 
     if len(original_images) == 1:
@@ -163,55 +700,20 @@ def save_comparison_figures(original_images, noisy_images, all_results, noise_ty
         axes[i, 1].axis('off')
 
     plt.tight_layout()
-    plt.savefig(f'{output_dir}/comparacao_original_ruido.png', dpi=150, bbox_inches='tight')
+    plt.savefig(path, dpi=150, bbox_inches='tight')
     plt.close()
-    print("OK")
 
-    # Figura 2: Comparação selecionada para relatório
-    selected_filters = ['Média 3x3', 'Média 7x7', 'Gaussiano 7x7', 'Mediana 3x3']
 
-    for img_idx in range(len(all_results)):
-        print(f"  - Comparação para relatório (Imagem {img_idx+1})...", end=' ', flush=True)
-
-        fig, axes = plt.subplots(2, 3, figsize=(15, 10))
-        axes = axes.flatten()
-
-        # Original
-        axes[0].imshow(original_images[img_idx], cmap='gray', vmin=0, vmax=255)
-        axes[0].set_title('Original', fontsize=14, fontweight='bold')
-        axes[0].axis('off')
-
-        # Ruidosa
-        axes[1].imshow(noisy_images[img_idx], cmap='gray', vmin=0, vmax=255)
-        axes[1].set_title(f'Com Ruído ({noise_type})', fontsize=14, fontweight='bold')
-        axes[1].axis('off')
-
-        # Filtros selecionados
-        for i, filter_name in enumerate(selected_filters):
-            if filter_name in all_results[img_idx]:
-                filtered_img = all_results[img_idx][filter_name]['image']
-                psnr = all_results[img_idx][filter_name]['psnr']
-                mse = all_results[img_idx][filter_name]['mse']
-
-                axes[i+2].imshow(filtered_img, cmap='gray', vmin=0, vmax=255)
-                axes[i+2].set_title(f'{filter_name}\nPSNR: {psnr:.2f} dB | MSE: {mse:.2f}', fontsize=12)
-                axes[i+2].axis('off')
-
-        plt.suptitle(f'Comparação Visual - Imagem {img_idx+1}', fontsize=16, fontweight='bold')
-        plt.tight_layout()
-        plt.savefig(f'{output_dir}/comparacao_relatorio_imagem{img_idx+1}.png', dpi=150, bbox_inches='tight')
-        plt.close()
-        print("OK")
-
-    # Figura 3: Gráficos de métricas
-    print("  - Gráficos de métricas...", end=' ', flush=True)
-    filter_names = list(all_results[0].keys())
+def plot_metrics_chart(path, all_metrics):
+    """Gráficos de MSE e PSNR por filtro; `all_metrics` tem as métricas (sem imagens) de cada imagem."""
+    plt = _pyplot()
+    filter_names = list(all_metrics[0].keys())
 
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
 
     # Gráfico de MSE
-    for img_idx in range(len(all_results)):
-        mse_values = [all_results[img_idx][f]['mse'] for f in filter_names]
+    for img_idx in range(len(all_metrics)):
+        mse_values = [all_metrics[img_idx][f]['mse'] for f in filter_names]
         ax1.plot(filter_names, mse_values, marker='o', label=f'Imagem {img_idx+1}', linewidth=2)
 
     ax1.set_xlabel('Filtro', fontsize=12, fontweight='bold')
@@ -222,8 +724,8 @@ def save_comparison_figures(original_images, noisy_images, all_results, noise_ty
     ax1.tick_params(axis='x', rotation=45)
 
     # Gráfico de PSNR
-    for img_idx in range(len(all_results)):
-        psnr_values = [all_results[img_idx][f]['psnr'] for f in filter_names]
+    for img_idx in range(len(all_metrics)):
+        psnr_values = [all_metrics[img_idx][f]['psnr'] for f in filter_names]
         ax2.plot(filter_names, psnr_values, marker='s', label=f'Imagem {img_idx+1}', linewidth=2)
 
     ax2.set_xlabel('Filtro', fontsize=12, fontweight='bold')
@@ -234,20 +736,214 @@ def save_comparison_figures(original_images, noisy_images, all_results, noise_ty
     ax2.tick_params(axis='x', rotation=45)
 
     plt.tight_layout()
-    plt.savefig(f'{output_dir}/graficos_metricas.png', dpi=150, bbox_inches='tight')
+    plt.savefig(path, dpi=150, bbox_inches='tight')
     plt.close()
-    print("OK")
+
+
+def _update_fingerprint(digest, value):
+    if isinstance(value, np.ndarray):
+        digest.update(f"{value.shape}|{value.dtype}|".encode())
+        digest.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(f"{key!r}:".encode())
+            _update_fingerprint(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"[{len(value)}]".encode())
+        for item in value:
+            _update_fingerprint(digest, item)
+    else:
+        digest.update(f"{value!r};".encode())
+
+
+def figure_fingerprint(plot_func, args):
+    """Hash do desenho e de todas as entradas de uma figura."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{FIGURES_VERSION}|{plot_func.__name__}|".encode())
+    _update_fingerprint(digest, args)
+    return digest.hexdigest()
+
+
+class FigureRenderer:
+    """
+    Gera as figuras num pool de processos (backend Agg), com no máximo
+    2 figuras pendentes por worker. Uma figura cujo arquivo já existe com a
+    mesma impressão digital das entradas (guardada em FIGURES_MANIFEST) não
+    é desenhada de novo.
+    """
+
+    def __init__(self, output_dir, workers=1):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.rendered = 0
+        self.skipped = 0
+        self._manifest_path = os.path.join(output_dir, FIGURES_MANIFEST)
+        try:
+            with open(self._manifest_path) as f:
+                self._manifest = json.load(f)
+        except (OSError, ValueError):
+            self._manifest = {}
+        self._pending = deque()
+        self._pool = None
+        if workers > 1:
+            # spawn: o processo principal já tem threads (gravação das imagens)
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def submit(self, filename, plot_func, *args):
+        """Agenda a figura; retorna False se ela já estava atualizada."""
+        path = os.path.join(self.output_dir, filename)
+        fingerprint = figure_fingerprint(plot_func, args)
+        if self._manifest.get(filename) == fingerprint and os.path.exists(path):
+            self.skipped += 1
+            return False
+
+        if self._pool is None:
+            plot_func(path, *args)
+            self._finish(filename, fingerprint)
+            return True
+
+        self._pending.append((filename, fingerprint, self._pool.submit(plot_func, path, *args)))
+        while len(self._pending) >= 2 * self.workers:
+            self._collect()
+        return True
+
+    def close(self):
+        """Espera as figuras pendentes e grava o manifesto."""
+        try:
+            while self._pending:
+                self._collect()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+            self._save_manifest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _collect(self):
+        filename, fingerprint, future = self._pending.popleft()
+        future.result()
+        self._finish(filename, fingerprint)
+
+    def _finish(self, filename, fingerprint):
+        self._manifest[filename] = fingerprint
+        self.rendered += 1
+
+    def _save_manifest(self):
+        if not self.rendered:
+            return
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path)
+
+
+def report_figure_args(img_idx, original, noisy, results, noise_type):
+    """
+    Entradas da figura do relatório, apenas com os filtros exibidos: os de
+    REPORT_FILTERS avaliados e, com --filters, os primeiros dos demais até
+    completar quatro.
+    """
+    names = [name for name in REPORT_FILTERS if name in results]
+    names += [name for name in results if name not in names][:len(REPORT_FILTERS) - len(names)]
+    selected = {name: results[name] for name in names}
+    return img_idx, original, noisy, selected, noise_type
+
+
+# =============================================================================
+# PERFIL DE INICIALIZAÇÃO
+# =============================================================================
+
+def print_startup_profile(top=8):
+    """Imprime o tempo de importação do script e das dependências sob demanda."""
+    # Mesmo resumo do `python start.py --profile-startup` da aplicação web
+    from start import profile_imports
+
+    script = os.path.splitext(os.path.basename(__file__))[0]
+    report = profile_imports((script,) + LAZY_MODULES, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    print("Tempo de importação (python -X importtime, resumido):\n")
+    name, total_ms, packages = report[0]
+    print(f"  {name}: {total_ms:.1f} ms")
+    for package, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"    {package:20s} {ms:8.1f} ms")
+
+    print("\n  Sob demanda (importados apenas no primeiro uso):")
+    for name, total_ms, _ in report[1:]:
+        print(f"    {name:20s} {total_ms:8.1f} ms")
 
 
 def main():
     parser = argparse.ArgumentParser(description='Processamento de Imagens - Filtros Espaciais')
-    parser.add_argument('--images', nargs='+', required=True, help='Caminhos das imagens a processar')
+    inputs = parser.add_mutually_exclusive_group()
+    inputs.add_argument('--images', nargs='+', help='Caminhos das imagens a processar')
+    inputs.add_argument('--input-dir', default=None,
+                        help='Diretório de imagens, processadas em streaming com memória constante')
+    parser.add_argument('--pattern', default=None,
+                        help='Padrão glob dos arquivos em --input-dir (default: extensões de imagem comuns)')
     parser.add_argument('--noise', choices=['salt_pepper', 'gaussian'], default='salt_pepper',
                         help='Tipo de ruído (default: salt_pepper)')
+    parser.add_argument('--filters', default=None,
+                        help="Filtros avaliados: pipelines separados por vírgula, com passos separados por '>' "
+                             "(ex.: 'mean:3, median:3>gaussian:5'); filtros: " + ', '.join(FILTER_REGISTRY)
+                             + f"; kernels ímpares de 3 a {MAX_KERNEL_SIZE} (default: {DEFAULT_FILTER_SPEC})")
     parser.add_argument('--output', default='results', help='Diretório de saída (default: results)')
+    parser.add_argument('--tile-workers', type=int, default=1,
+                        help='Workers para aplicar cada filtro em blocos paralelos (default: 1)')
+    parser.add_argument('--tile-processes', action='store_true',
+                        help='Usa processos em vez de threads para os blocos')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed do ruído (a imagem N usa seed + N - 1); necessária para o cache')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processos para processar várias imagens em paralelo (default: 1)')
+    parser.add_argument('--image-format', choices=IMAGE_FORMATS, default='png',
+                        help='Formato das imagens salvas: png, webp (sem perdas) ou npy (default: png)')
+    parser.add_argument('--png-compression', type=int, choices=range(10), default=None, metavar='0-9',
+                        help='Nível de compressão PNG, de 0 (rápido) a 9 (menor) (default: padrão do OpenCV)')
+    parser.add_argument('--skip-filtered', action='store_true',
+                        help='Não salva as imagens filtradas (apenas original e ruidosa)')
+    parser.add_argument('--writer-threads', type=int, default=2,
+                        help='Threads de gravação das imagens em segundo plano (default: 2)')
+    parser.add_argument('--figures', choices=['none', 'summary', 'all'], default='all',
+                        help='Figuras geradas: nenhuma, só as com todas as imagens, ou também uma por imagem '
+                             '(default: all)')
+    parser.add_argument('--figure-workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Processos para desenhar as figuras (default: até 4, conforme as CPUs)')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Diretório do cache de resultados em disco (default: desativado)')
+    parser.add_argument('--cache-max-mb', type=float, default=256,
+                        help='Limite do cache em memória e em disco, em MB (default: 256)')
+    parser.add_argument('--out-of-core', action='store_true',
+                        help='Processa cada imagem em disco (np.memmap, .npy) em faixas de linhas, para imagens '
+                             'maiores que a memória; aceita também entradas .npy')
+    parser.add_argument('--tile-rows', type=int, default=512,
+                        help='Linhas por faixa no modo --out-of-core (default: 512)')
+
+    parser.add_argument('--timings', action='store_true',
+                        help='Inclui tempo e bytes alocados por etapa em metricas_imagem_N.csv')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Mostra o tempo de importação do script e das dependências e sai')
 
     args = parser.parse_args()
 
+    if args.profile_startup:
+        print_startup_profile()
+        return
+    if not args.images and not args.input_dir:
+        parser.error('informe --images ou --input-dir')
+    filters = FILTERS
+    if args.filters is not None:
+        try:
+            filters = parse_pipeline_spec(args.filters)
+        except ValueError as e:
+            parser.error(f'--filters: {e}')
+    if args.out_of_core and args.figures != 'none':
+        print("Aviso: figuras desativadas com --out-of-core")
+        args.figures = 'none'
+
     # Criar diretórios
     os.makedirs(args.output, exist_ok=True)
 
@@ -256,104 +952,113 @@ def main():
     print(" "*10 + "Filtros Espaciais para Redução de Ruído")
     print("="*70)
 
-    # Carregar imagens
-    print(f"\n1. Carregando imagens...")
-    original_images = []
-
-    for img_path in args.images:
-        if os.path.exists(img_path):
-            img = cv2.imread(img_path)
-            if img is None:
-                print(f"  ⚠️ Erro ao carregar: {img_path}")
-                continue
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            original_images.append(gray)
-            print(f"  ✓ {img_path} ({gray.shape[1]}x{gray.shape[0]})")
-        else:
-            print(f"  ⚠️ Não encontrado: {img_path}")
-
-    if len(original_images) == 0:
-        print("\n❌ Nenhuma imagem foi carregada!")
-        return
-
-    print(f"\n✓ {len(original_images)} imagem(ns) carregada(s)")
-
-    # Gerar ruído
-    print(f"\n2. Aplicando ruído ({args.noise})...")
-    noisy_images = []
-
-    for i, img in enumerate(original_images):
-        if args.noise == 'salt_pepper':
-            noisy = add_salt_pepper_noise(img, salt_prob=0.02, pepper_prob=0.02)
-        else:
-            noisy = add_gaussian_noise(img, mean=0, sigma=25)
-        noisy_images.append(noisy)
-        print(f"  ✓ Imagem {i+1}")
+    # Seeds determinísticas por imagem: a imagem N usa seed + N - 1, então
+    # a execução paralela gera os mesmos resultados da serial
+    base_seed = args.seed
+    if base_seed is None:
+        base_seed = int(np.random.SeedSequence().entropy % (2**32))
+    use_cache = args.seed is not None and not args.out_of_core
+    cache_max_bytes = int(args.cache_max_mb * 1024 * 1024)
+    cache_stats = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    # Com --input-dir as imagens são processadas em streaming: cada uma é
+    # carregada, filtrada, avaliada, salva e descartada antes da próxima
+    streaming = args.input_dir is not None
+    if streaming:
+        paths = find_input_images(args.input_dir, args.pattern)
+    else:
+        paths = args.images
 
     # Processar imagens
-    print(f"\n3. Aplicando filtros e calculando métricas...")
-    all_results = []
-
-    for i, (original, noisy) in enumerate(zip(original_images, noisy_images)):
-        print(f"\nImagem {i+1}:")
-        results = process_image_with_filters(original, noisy)
-        all_results.append(results)
-
-    # Salvar tabelas
-    print(f"\n4. Gerando tabelas de resultados...")
-
-    for i, results in enumerate(all_results):
-        data = []
-        for filter_name, metrics in results.items():
-            data.append({
-                'Filtro': filter_name,
-                'MSE': f"{metrics['mse']:.4f}",
-                'PSNR (dB)': f"{metrics['psnr']:.4f}"
-            })
-
-        df = pd.DataFrame(data)
-        csv_path = f'{args.output}/metricas_imagem_{i+1}.csv'
-        df.to_csv(csv_path, index=False)
-        print(f"  ✓ {csv_path}")
-
-    # Tabela média
-    if len(all_results) > 1:
-        filter_names = list(all_results[0].keys())
-        avg_data = []
-
-        for filter_name in filter_names:
-            avg_mse = np.mean([r[filter_name]['mse'] for r in all_results])
-            avg_psnr = np.mean([r[filter_name]['psnr'] for r in all_results])
-
-            avg_data.append({
-                'Filtro': filter_name,
-                'MSE Médio': f"{avg_mse:.4f}",
-                'PSNR Médio (dB)': f"{avg_psnr:.4f}"
-            })
-
-        df_avg = pd.DataFrame(avg_data)
-        df_avg.to_csv(f'{args.output}/metricas_media.csv', index=False)
-        print(f"  ✓ {args.output}/metricas_media.csv")
-
-    # Salvar figuras
-    print(f"\n5. Gerando figuras...")
-    save_comparison_figures(original_images, noisy_images, all_results, args.noise, args.output)
-
-    # Salvar imagens processadas
-    print(f"\n6. Salvando imagens processadas...")
-
-    for img_idx, results in enumerate(all_results):
-        img_folder = f'{args.output}/imagem_{img_idx+1}'
-        os.makedirs(img_folder, exist_ok=True)
-
-        cv2.imwrite(f'{img_folder}/original.png', original_images[img_idx])
-        cv2.imwrite(f'{img_folder}/ruidosa.png', noisy_images[img_idx])
-
-        for filter_name, data in results.items():
-            filename = filter_name.lower().replace(' ', '_').replace('x', '')
-            cv2.imwrite(f'{img_folder}/{filename}.png', data['image'])
-
-        print(f"  ✓ {img_folder}/ ({len(results)+2} arquivos)")
+    print(f"\n1. Processando imagens (ruído {args.noise}, filtros e métricas)...")
+    print(f"  Seed base: {base_seed}")
+    print(f"  Filtros: {', '.join(name for name, _ in filters)}")
+    if streaming:
+        print(f"  {len(paths)} arquivo(s) em {args.input_dir}")
+
+    accumulator = MetricsAccumulator()
+    # Fora do streaming, originais, ruidosas e métricas são mantidas para as
+    # figuras com todas as imagens (as imagens filtradas não são guardadas)
+    keep_summary = not streaming and args.figures != 'none'
+    original_images = []
+    noisy_images = []
+    all_metrics = []
+
+    if args.out_of_core:
+        # Ruidosa e filtradas já são gravadas como .npy em imagem_N/
+        pipeline = iter_out_of_core_results(
+            paths, args.noise, base_seed, args.output, tile_rows=args.tile_rows,
+            tile_workers=args.tile_workers, tile_processes=args.tile_processes, timings=args.timings,
+            filters=filters,
+        )
+    else:
+        pipeline = iter_pipeline_results(
+            iter_input_images(paths, timings=args.timings), args.noise, base_seed, use_cache,
+            workers=args.workers, tile_workers=args.tile_workers, tile_processes=args.tile_processes,
+            cache_max_bytes=cache_max_bytes, cache_dir=args.cache_dir, cache_stats=cache_stats, filters=filters,
+        )
+    writer = ImageWriter(args.image_format, png_compression=args.png_compression, threads=args.writer_threads)
+    renderer = FigureRenderer(args.output, workers=args.figure_workers if args.figures != 'none' else 1)
+
+    with renderer:
+        with writer:
+            for img_idx, img_path, original, noisy, results, stages in pipeline:
+                save_metrics_csv(results, f'{args.output}/metricas_imagem_{img_idx+1}.csv',
+                                 stages if args.timings else None)
+                if args.out_of_core:
+                    img_folder = f'{args.output}/imagem_{img_idx+1}'
+                    n_files = len(results) + 1 + os.path.exists(f'{img_folder}/original.npy')
+                else:
+                    img_folder, n_files = save_processed_images(writer, args.output, img_idx, original, noisy,
+                                                                results, skip_filtered=args.skip_filtered)
+                accumulator.add(results)
+
+                if args.figures == 'all':
+                    renderer.submit(f'comparacao_relatorio_imagem{img_idx+1}.png', plot_report_figure,
+                                    *report_figure_args(img_idx, original, noisy, results, args.noise))
+                if keep_summary:
+                    original_images.append(original)
+                    noisy_images.append(noisy)
+                    all_metrics.append({name: {'mse': data['mse'], 'psnr': data['psnr']}
+                                        for name, data in results.items()})
+
+                print(f"  ✓ Imagem {img_idx+1}: {img_path} ({original.shape[1]}x{original.shape[0]}) -> "
+                      f"metricas_imagem_{img_idx+1}.csv, {img_folder}/ ({n_files} arquivos)")
+
+        if accumulator.count == 0:
+            print("\n❌ Nenhuma imagem foi carregada!")
+            return
+
+        # Tabela média, calculada a partir das somas acumuladas
+        print(f"\n2. Gerando tabela média...")
+        mean_metrics = accumulator.means()
+
+        if accumulator.count > 1:
+            avg_data = []
+            for filter_name, means in mean_metrics.items():
+                avg_data.append({
+                    'Filtro': filter_name,
+                    'MSE Médio': f"{means['mse']:.4f}",
+                    'PSNR Médio (dB)': f"{means['psnr']:.4f}",
+                    'SSIM Médio': f"{means['ssim']:.4f}"
+                })
+
+            import pandas as pd
+            df_avg = pd.DataFrame(avg_data)
+            df_avg.to_csv(f'{args.output}/metricas_media.csv', index=False)
+            print(f"  ✓ {args.output}/metricas_media.csv")
+
+        # Figuras com todas as imagens
+        print(f"\n3. Gerando figuras ({args.figures})...")
+        if keep_summary:
+            renderer.submit('comparacao_original_ruido.png', plot_noise_comparison,
+                            original_images, noisy_images, args.noise)
+            renderer.submit('graficos_metricas.png', plot_metrics_chart, all_metrics)
+        elif streaming and args.figures != 'none':
+            print("  (figuras com todas as imagens não são geradas com --input-dir)")
+
+    if args.figures != 'none':
+        print(f"  ✓ {renderer.rendered} figura(s) gerada(s), {renderer.skipped} sem alterações")
 
     # Resumo final
     print("\n" + "="*70)
@@ -361,25 +1066,24 @@ def main():
     print("="*70)
 
     print(f"\n📊 Estatísticas:")
-    print(f"  • Imagens processadas: {len(all_results)}")
+    print(f"  • Imagens processadas: {accumulator.count}")
     print(f"  • Tipo de ruído: {args.noise}")
-    print(f"  • Filtros testados: {len(all_results[0])}")
+    print(f"  • Filtros testados: {len(mean_metrics)}")
+    if writer.files_written:
+        throughput = writer.bytes_written / max(writer.write_seconds, 1e-9) / 1024**2
+        print(f"  • Imagens gravadas: {writer.files_written} arquivos ({args.image_format}), "
+              f"{writer.bytes_written / 1024**2:.1f} MB, {throughput:.1f} MB/s por thread")
+    if use_cache:
+        print(f"  • Cache: {cache_stats['hits']} acertos ({cache_stats['disk_hits']} do disco), "
+              f"{cache_stats['misses']} falhas")
 
     # Melhor filtro
-    filter_names = list(all_results[0].keys())
-    avg_mse_per_filter = {}
-
-    for filter_name in filter_names:
-        avg_mse = np.mean([r[filter_name]['mse'] for r in all_results])
-        avg_mse_per_filter[filter_name] = avg_mse
-
-    best_filter = min(avg_mse_per_filter.items(), key=lambda x: x[1])
-    best_psnr = np.mean([r[best_filter[0]]['psnr'] for r in all_results])
+    best_filter, best_means = min(mean_metrics.items(), key=lambda item: item[1]['mse'])
 
     print(f"\n🏆 Melhor filtro (média):")
-    print(f"  • {best_filter[0]}")
-    print(f"  • MSE médio: {best_filter[1]:.4f}")
-    print(f"  • PSNR médio: {best_psnr:.4f} dB")
+    print(f"  • {best_filter}")
+    print(f"  • MSE médio: {best_means['mse']:.4f}")
+    print(f"  • PSNR médio: {best_means['psnr']:.4f} dB")
 
     print(f"\n📁 Resultados salvos em: {args.output}/")
 
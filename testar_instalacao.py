@@ -141,6 +141,159 @@ def test_matplotlib():
         return False
 
 
+# Tempo máximo de importação do script (ms) e módulos que não devem ser
+# carregados na inicialização (são importados apenas quando usados)
+IMPORT_BUDGET_MS = 500
+LAZY_MODULES = ['matplotlib', 'pandas', 'scipy']
+
+# O mesmo para a aplicação web (main.py, importado de dentro de webapp/);
+# o FastAPI e o pydantic respondem pela maior parte do tempo
+WEBAPP_IMPORT_BUDGET_MS = 1500
+WEBAPP_LAZY_MODULES = ['pandas', 'plotly']
+
+
+def check_import_time(module, budget_ms, lazy_modules, cwd=None, env=None):
+    """Importa `module` com python -X importtime e confere tempo e módulos carregados."""
+
+    import subprocess
+
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {lazy_modules!r} if m in sys.modules))")
+    try:
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                              capture_output=True, text=True, timeout=60, cwd=cwd, env=env)
+    except subprocess.TimeoutExpired:
+        print("✗ Importação excedeu 60 s")
+        print()
+        return False
+
+    if proc.returncode != 0:
+        print(f"✗ Erro ao importar {module}: {proc.stderr.strip().splitlines()[-1]}")
+        print()
+        return False
+
+    total_ms = 0.0
+    for line in proc.stderr.splitlines():
+        if line.endswith(f'| {module}'):
+            total_ms = int(line.split('|')[1]) / 1000
+
+    loaded = [m for m in proc.stdout.strip().split(',') if m]
+    ok = total_ms <= budget_ms and not loaded
+
+    print(f"  {'✓' if total_ms <= budget_ms else '✗'} Importação: {total_ms:.1f} ms "
+          f"(limite: {budget_ms} ms)")
+    if loaded:
+        print(f"  ✗ Carregados na inicialização: {', '.join(loaded)}")
+    else:
+        print(f"  ✓ Dependências pesadas carregadas sob demanda")
+    print()
+    return ok
+
+
+def test_startup_time():
+    """Verifica o tempo de importação de processamento_imagens.py."""
+
+    print("Testando tempo de inicialização...")
+    print()
+    return check_import_time('processamento_imagens', IMPORT_BUDGET_MS, LAZY_MODULES)
+
+
+def test_webapp_startup_time():
+    """Verifica o tempo de importação da aplicação web (webapp/main.py)."""
+
+    import os
+    import tempfile
+
+    print("Testando tempo de inicialização da aplicação web...")
+    print()
+
+    webapp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp')
+    # A importação abre a fila de jobs: um banco temporário mantém
+    # webapp/jobs.sqlite3 intacto
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, JOBS_DB=os.path.join(tmp, 'jobs.sqlite3'))
+        return check_import_time('main', WEBAPP_IMPORT_BUDGET_MS, WEBAPP_LAZY_MODULES, cwd=webapp_dir, env=env)
+
+
+# Especificação de exemplo: os filtros padrão, pipelines que reaproveitam
+# prefixos e passos lineares consecutivos (fundidos)
+SAMPLE_FILTER_SPEC = ('mean:3, mean:7, gaussian:3, gaussian:7, median:3, median:7, mode:3, mode:7, '
+                      'median:3>gaussian:5, Mediana 3x3 > Gaussiano 5x5 > moda 3, gaussian:3>mean:5>gaussian:7')
+
+
+def test_filter_pipelines():
+    """Verifica os pipelines de filtros do script e da aplicação web."""
+
+    import os
+
+    print("Testando pipelines de filtros...")
+    print()
+
+    try:
+        import numpy as np
+
+        import processamento_imagens as cli
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webapp'))
+        import filters
+        from image_processor import ImageProcessor
+        from tiling import TileExecutor
+
+        rng = np.random.default_rng(0)
+        original = rng.integers(0, 256, (300, 200), dtype=np.uint8)
+        noisy = cli.add_gaussian_noise(original, seed=0)
+        pipelines = cli.parse_pipeline_spec(SAMPLE_FILTER_SPEC)
+        names = [name for name, _ in pipelines]
+
+        def run(spec_pipelines, tiles=None):
+            results = cli.process_image_with_filters(original, noisy, tiles=tiles, verbose=False,
+                                                     filters=spec_pipelines)
+            return {name: result['image'] for name, result in results.items()}
+
+        def stepwise(steps):
+            image = noisy
+            for key, kernel_size in steps:
+                image = filters.FILTER_REGISTRY[key][1](image, kernel_size)
+            return image
+
+        untiled = run(pipelines)
+        with TileExecutor(workers=3) as tiles:
+            tiled = run(pipelines, tiles)
+        webapp = ImageProcessor(workers=3).apply_filters(names, original, noisy)
+        default = dict(filters.parse_pipeline_spec(filters.DEFAULT_FILTER_SPEC))
+        fused = [steps for _, steps in pipelines if len(filters.compile_pipeline(steps)) < len(steps)]
+
+        checks = [
+            ("Script e aplicação web leem a especificação igual",
+             pipelines == filters.parse_pipeline_spec(SAMPLE_FILTER_SPEC)
+             and dict(cli.FILTERS) == default),
+            ("Filtros padrão idênticos à função de cada filtro",
+             all(np.array_equal(untiled[name], stepwise(steps)) for name, steps in default.items())),
+            ("Passos lineares fundidos a no máximo 1 nível de cinza",
+             bool(fused) and all(
+                 np.abs(untiled[filters.pipeline_name(steps)].astype(int) - stepwise(steps)).max() <= 1
+                 for steps in fused)),
+            ("Execução em blocos idêntica à imagem inteira",
+             all(np.array_equal(untiled[name], tiled[name]) for name in names)),
+            ("Prefixo reaproveitado idêntico ao pipeline isolado",
+             all(np.array_equal(untiled[name], run([(name, steps)])[name])
+                 for name, steps in pipelines if len(steps) > 1)),
+            ("Aplicação web idêntica ao script",
+             all(np.array_equal(untiled[name], webapp[name]['image']) for name in names)),
+        ]
+
+        ok = True
+        for name, passed in checks:
+            print(f"  {'✓' if passed else '✗'} {name}")
+            ok = ok and passed
+        print()
+        return ok
+
+    except Exception as e:
+        print(f"✗ Erro ao testar os pipelines: {e}")
+        print()
+        return False
+
+
 def check_python_version():
     """Verifica versão do Python."""
 
@@ -253,6 +406,18 @@ def main():
     # Teste 5: Estrutura de arquivos
     results.append(test_file_structure())
 
+    # Teste 6: Tempo de inicialização
+    if results[1]:  # Só testa se imports OK
+        results.append(test_startup_time())
+
+    # Teste 7: Tempo de inicialização da aplicação web
+    if results[1]:  # Só testa se imports OK
+        results.append(test_webapp_startup_time())
+
+    # Teste 8: Pipelines de filtros
+    if results[1]:  # Só testa se imports OK
+        results.append(test_filter_pipelines())
+
     # Resumo final
     print("="*60)
     print(" "*20 + "RESUMO FINAL")
@@ -0,0 +1,172 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from filters import parse_filter, step_name
+
+
+# Custo estimado, em ms por megapixel, de cada filtro e das etapas fixas
+# (ruído e PNG da ruidosa por imagem; métricas e PNG por filtro), medido
+# com um worker numa imagem de 1024x1024. Só as proporções importam: a
+# moda custa centenas de vezes mais que a média ou a gaussiana.
+FILTER_COST = {
+    'Média 3x3': 1,
+    'Média 7x7': 1,
+    'Gaussiano 3x3': 1,
+    'Gaussiano 7x7': 1,
+    'Mediana 3x3': 1,
+    'Mediana 7x7': 45,
+    'Moda 3x3': 330,
+    'Moda 7x7': 330,
+}
+IMAGE_COST = 25
+FILTER_OVERHEAD_COST = 45
+# Passos de pipeline fora de FILTER_COST: custo do filtro com kernel 7x7,
+# proporcional ao kernel acima disso
+STEP_COST = {'mean': 1, 'gaussian': 1, 'median': 45, 'mode': 330}
+
+
+def filter_cost(filter_name: str) -> float:
+    if filter_name in FILTER_COST:
+        return FILTER_COST[filter_name]
+    try:
+        steps = parse_filter(filter_name)
+    except ValueError:
+        return max(FILTER_COST.values())
+    return sum(FILTER_COST.get(step_name(key, kernel_size), STEP_COST.get(key, 330) * max(1.0, kernel_size / 7))
+               for key, kernel_size in steps)
+
+
+def estimate_cost(shape: Tuple[int, ...], filter_names: Iterable[str]) -> float:
+    megapixels = shape[0] * shape[1] / 1e6
+    per_megapixel = IMAGE_COST + sum(filter_cost(name) + FILTER_OVERHEAD_COST for name in filter_names)
+    return megapixels * per_megapixel
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(f"Servidor ocupado, tente novamente em {retry_after} s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Ticket:
+    __slots__ = ("controller", "cost", "start", "released")
+
+    def __init__(self, controller: "AdmissionController", cost: float):
+        self.controller = controller
+        self.cost = cost
+        self.start = time.monotonic()
+        self.released = False
+
+    def release(self):
+        # Idempotente: pode ser chamado pelo handler e pela tarefa de fundo
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Limita o custo estimado (pixels x filtros, veja estimate_cost) dos
+    processamentos em andamento a `capacity`. Quem não cabe espera numa
+    fila FIFO de até `max_queue` pedidos; com a fila cheia, ou após
+    `timeout` segundos na fila, o pedido é recusado com QueueFull, que traz
+    uma estimativa de quando tentar de novo.
+
+    Um pedido mais caro que a capacidade inteira é admitido quando não há
+    nada em andamento, para não ser recusado para sempre. Vale para um
+    processo (um worker do uvicorn).
+    """
+
+    def __init__(self, capacity: float, max_queue: int, parallelism: int = 1,
+                 on_change: Optional[Callable[[Dict], None]] = None):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.parallelism = max(1, parallelism)
+        self.on_change = on_change
+        self.in_use = 0.0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "timeout": 0}
+        # Razão entre o tempo real (ms) e o custo estimado, para o Retry-After
+        self.ms_per_cost = 1.0
+        self._waiters: "deque[Tuple[float, asyncio.Future]]" = deque()
+
+    def _fits(self, cost: float) -> bool:
+        return self.running == 0 or self.in_use + cost <= self.capacity
+
+    def _grant(self, cost: float) -> Ticket:
+        self.in_use += cost
+        self.running += 1
+        self.admitted += 1
+        return Ticket(self, cost)
+
+    def retry_after(self, cost: float = 0.0) -> int:
+        backlog = self.in_use + sum(waiting for waiting, _ in self._waiters) + cost
+        seconds = backlog * self.ms_per_cost / 1000 / self.parallelism
+        return min(60, max(1, math.ceil(seconds)))
+
+    async def acquire(self, cost: float, timeout: Optional[float] = None) -> Ticket:
+        if not self._waiters and self._fits(cost):
+            ticket = self._grant(cost)
+            self._notify()
+            return ticket
+        if len(self._waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            self._notify()
+            raise QueueFull(self.retry_after(cost), "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (cost, waiter)
+        self._waiters.append(entry)
+        self._notify()
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitido no mesmo instante em que o prazo acabou
+                return waiter.result()
+            self._waiters.remove(entry)
+            waiter.cancel()
+            self.rejected["timeout"] += 1
+            self._notify()
+            raise QueueFull(self.retry_after(cost), "timeout")
+        except asyncio.CancelledError:
+            # Cliente desconectado enquanto esperava
+            if waiter.done() and not waiter.cancelled():
+                waiter.result().release()
+            else:
+                self._waiters.remove(entry)
+                waiter.cancel()
+                self._notify()
+            raise
+
+    def _release(self, ticket: Ticket):
+        self.in_use -= ticket.cost
+        self.running -= 1
+        if ticket.cost > 0:
+            elapsed_ms = (time.monotonic() - ticket.start) * 1000
+            self.ms_per_cost += 0.2 * (elapsed_ms / ticket.cost - self.ms_per_cost)
+        # Admite, em ordem, os pedidos da fila que couberem
+        while self._waiters and self._fits(self._waiters[0][0]):
+            cost, waiter = self._waiters.popleft()
+            waiter.set_result(self._grant(cost))
+        self._notify()
+
+    def stats(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "in_use": round(self.in_use, 1),
+            "running": self.running,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+    def _notify(self):
+        if self.on_change is not None:
+            self.on_change(self.stats())
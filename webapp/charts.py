@@ -0,0 +1,62 @@
+import hashlib
+import json
+from typing import Dict
+
+
+def chart_series(results: Dict[str, Dict]) -> Dict:
+    # Séries numéricas dos gráficos, calculadas uma vez quando a sessão
+    # termina o processamento; é o que /api/charts?compact=1 devolve
+    filter_names = list(results.keys())
+    series = {
+        "filters": filter_names,
+        "mse": [float(results[f]['mse']) for f in filter_names],
+        "psnr": [float(results[f]['psnr']) for f in filter_names],
+        "ssim": [float(results[f]['ssim']) for f in filter_names],
+    }
+    encoded = json.dumps(series, separators=(",", ":")).encode()
+    series["etag"] = hashlib.blake2b(encoded, digest_size=8).hexdigest()
+    return series
+
+
+def plotly_charts_json(series: Dict) -> bytes:
+    # Resposta completa de /api/charts (figuras do plotly), já serializada:
+    # montada só no primeiro pedido e guardada na sessão
+    import plotly.graph_objects as go
+
+    filter_names = series["filters"]
+    mse_values = series["mse"]
+    psnr_values = series["psnr"]
+
+    fig_mse = go.Figure()
+    fig_mse.add_trace(go.Bar(
+        x=filter_names, y=mse_values, name='MSE',
+        marker_color='rgb(55, 83, 109)',
+        text=[f'{v:.2f}' for v in mse_values],
+        textposition='auto',
+    ))
+    fig_mse.update_layout(title='MSE por Filtro', xaxis_title='Filtro', yaxis_title='MSE', height=400, template='plotly_white')
+
+    fig_psnr = go.Figure()
+    fig_psnr.add_trace(go.Bar(
+        x=filter_names, y=psnr_values, name='PSNR',
+        marker_color='rgb(26, 118, 255)',
+        text=[f'{v:.2f}' for v in psnr_values],
+        textposition='auto',
+    ))
+    fig_psnr.update_layout(title='PSNR por Filtro', xaxis_title='Filtro', yaxis_title='PSNR (dB)', height=400, template='plotly_white')
+
+    fig_comparison = go.Figure()
+    fig_comparison.add_trace(go.Scatter(
+        x=mse_values, y=psnr_values, mode='markers+text',
+        text=[f.replace(' ', '<br>') for f in filter_names],
+        textposition='top center',
+        marker=dict(size=12, color=psnr_values, colorscale='Viridis', showscale=True, colorbar=dict(title="PSNR (dB)")),
+    ))
+    fig_comparison.update_layout(title='MSE vs PSNR', xaxis_title='MSE', yaxis_title='PSNR (dB)', height=500, template='plotly_white')
+
+    # Cada figura já sai em JSON; só o envelope é montado aqui
+    return (
+        '{"success":true,"charts":{"mse":' + fig_mse.to_json()
+        + ',"psnr":' + fig_psnr.to_json()
+        + ',"comparison":' + fig_comparison.to_json() + '}}'
+    ).encode()
@@ -0,0 +1,275 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from tiling import FILTER_BORDERS, TileExecutor, register_filter as register_border
+
+
+# Passo de um pipeline: (chave do filtro, tamanho do kernel)
+Step = Tuple[str, int]
+# Operação executável: (função, tamanho do kernel, argumentos extras)
+Operation = Tuple[Callable, int, tuple]
+
+# Maior kernel aceito numa especificação de pipeline
+MAX_KERNEL_SIZE = 31
+
+# Filtros padrão, do mais rápido para o mais lento
+DEFAULT_FILTER_SPEC = 'mean:3, mean:7, gaussian:3, gaussian:7, median:3, median:7, mode:3, mode:7'
+
+
+def apply_mean_filter(image: np.ndarray, kernel_size: int = 3, out: Optional[np.ndarray] = None) -> np.ndarray:
+    return cv2.blur(image, (kernel_size, kernel_size), dst=out)
+
+
+def gaussian_sigma(kernel_size: int) -> float:
+    # Mesma fórmula que o OpenCV usa com sigma 0
+    return 0.3 * ((kernel_size - 1) * 0.5 - 1) + 0.8
+
+
+def apply_gaussian_filter(image: np.ndarray, kernel_size: int = 3, out: Optional[np.ndarray] = None) -> np.ndarray:
+    return cv2.GaussianBlur(image, (kernel_size, kernel_size), gaussian_sigma(kernel_size), dst=out)
+
+
+def apply_median_filter(image: np.ndarray, kernel_size: int = 3, out: Optional[np.ndarray] = None) -> np.ndarray:
+    return cv2.medianBlur(image, kernel_size, dst=out)
+
+
+def apply_mode_filter(image: np.ndarray, kernel_size: int = 3, out: Optional[np.ndarray] = None) -> np.ndarray:
+    # Histogramas deslizantes (Huang) para todas as colunas da linha;
+    # argmax resolve empates pelo menor valor, como scipy.stats.mode
+    pad = kernel_size // 2
+    padded = np.pad(image, pad, mode='edge')
+    height, width = image.shape
+    hist = np.zeros(width * 256, dtype=np.min_scalar_type(kernel_size * kernel_size))
+    base = np.arange(width) * 256
+    output = out if out is not None else np.empty((height, width), dtype=np.uint8)
+    for i in range(height):
+        if i == 0:
+            for row in padded[:kernel_size]:
+                for dx in range(kernel_size):
+                    hist[base + row[dx:dx+width]] += 1
+        else:
+            leaving = padded[i - 1]
+            entering = padded[i + kernel_size - 1]
+            for dx in range(kernel_size):
+                hist[base + leaving[dx:dx+width]] -= 1
+                hist[base + entering[dx:dx+width]] += 1
+        output[i] = hist.reshape(width, 256).argmax(axis=1)
+    return output
+
+
+def apply_separable_filter(image: np.ndarray, kernel_size: int, kernel: np.ndarray,
+                           out: Optional[np.ndarray] = None) -> np.ndarray:
+    # Filtros lineares fundidos: o kernel 1D nas linhas e nas colunas numa
+    # única passada, com a mesma borda de cv2.blur e cv2.GaussianBlur
+    return cv2.sepFilter2D(image, -1, kernel, kernel, dst=out, borderType=cv2.BORDER_REFLECT_101)
+
+
+# Custo estimado de uma passada linear sobre a imagem, medido com imagens
+# de 2048x2048: uma parte fixa mais uma por elemento do kernel 1D, exceto
+# nos filtros de custo constante (cv2.blur)
+LINEAR_PASS_COST = 4.0
+LINEAR_TAP_COST = 0.45
+
+# Chave -> (nome, função, kernel 1D dos filtros lineares separáveis ou None,
+# custo independente do kernel)
+FILTER_REGISTRY: Dict[str, Tuple[str, Callable, Optional[Callable[[int], np.ndarray]], bool]] = {}
+
+
+def register_filter(key: str, label: str, filter_func: Callable, border: str,
+                    kernel_1d: Optional[Callable[[int], np.ndarray]] = None, constant_time: bool = False) -> Callable:
+    # filter_func recebe (imagem, kernel_size, out=None); border é o modo de
+    # np.pad equivalente (execução em blocos); os filtros lineares
+    # separáveis informam kernel_1d para serem fundidos em sequência
+    FILTER_REGISTRY[key] = (label, filter_func, kernel_1d, constant_time)
+    return register_border(filter_func, border)
+
+
+def _box_kernel(kernel_size: int) -> np.ndarray:
+    return np.full(kernel_size, 1.0 / kernel_size)
+
+
+def _gaussian_kernel(kernel_size: int) -> np.ndarray:
+    return cv2.getGaussianKernel(kernel_size, gaussian_sigma(kernel_size)).ravel()
+
+
+register_filter('mean', 'Média', apply_mean_filter, 'reflect', _box_kernel, constant_time=True)
+register_filter('gaussian', 'Gaussiano', apply_gaussian_filter, 'reflect', _gaussian_kernel)
+register_filter('median', 'Mediana', apply_median_filter, 'edge')
+register_filter('mode', 'Moda', apply_mode_filter, 'edge')
+register_border(apply_separable_filter, 'reflect')
+
+
+def _fold(text: str) -> str:
+    return unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode()
+
+
+def step_name(key: str, kernel_size: int) -> str:
+    return f"{FILTER_REGISTRY[key][0]} {kernel_size}x{kernel_size}"
+
+
+def pipeline_name(steps: Iterable[Step]) -> str:
+    return ' > '.join(step_name(key, kernel_size) for key, kernel_size in steps)
+
+
+def parse_filter_step(text: str) -> Step:
+    # 'median:5', 'median5', 'mediana 5' ou 'Mediana 5x5', sem diferenciar
+    # maiúsculas nem acentos; kernel ímpar de 3 a MAX_KERNEL_SIZE
+    match = re.fullmatch(r'\s*([^\W\d_]+)\s*:?\s*(\d+)(?:\s*x\s*(\d+))?\s*', text)
+    if match is None:
+        raise ValueError(f"Passo de filtro inválido: '{text.strip()}'")
+    name, size, size_y = match.groups()
+    aliases = {}
+    for key, (label, _, _, _) in FILTER_REGISTRY.items():
+        aliases[_fold(key)] = key
+        aliases[_fold(label)] = key
+    key = aliases.get(_fold(name))
+    if key is None:
+        raise ValueError(f"Filtro desconhecido: '{name}' (disponíveis: {', '.join(FILTER_REGISTRY)})")
+    kernel_size = int(size)
+    if size_y is not None and int(size_y) != kernel_size:
+        raise ValueError(f"Kernel deve ser quadrado: '{text.strip()}'")
+    if kernel_size % 2 == 0 or not 3 <= kernel_size <= MAX_KERNEL_SIZE:
+        raise ValueError(f"Tamanho de kernel inválido: {kernel_size} (ímpar, de 3 a {MAX_KERNEL_SIZE})")
+    return key, kernel_size
+
+
+@lru_cache(maxsize=256)
+def parse_filter(name: str) -> Tuple[Step, ...]:
+    # Um pipeline, com passos separados por '>'; aceita o próprio nome
+    # (pipeline_name), que é como os resultados são identificados
+    return tuple(parse_filter_step(step) for step in name.split('>'))
+
+
+def parse_pipeline_spec(spec: str) -> List[Tuple[str, Tuple[Step, ...]]]:
+    """
+    Lê uma especificação de filtros: pipelines separados por vírgula, cada
+    um com passos separados por '>', como 'mean:3, median:3>gaussian:5'.
+    Retorna [(nome, passos)] sem repetições; levanta ValueError se a
+    especificação for inválida.
+    """
+    pipelines = {}
+    for entry in spec.split(','):
+        if entry.strip():
+            steps = parse_filter(entry)
+            pipelines.setdefault(pipeline_name(steps), steps)
+    if not pipelines:
+        raise ValueError("Nenhum filtro informado")
+    return list(pipelines.items())
+
+
+def parse_filter_names(spec: str) -> List[str]:
+    return [name for name, _ in parse_pipeline_spec(spec)]
+
+
+def _linear_cost(group: List[Step]) -> float:
+    # Um passo usa a própria função; vários, uma passada fundida
+    if len(group) == 1:
+        key, kernel_size = group[0]
+        return LINEAR_PASS_COST + (0 if FILTER_REGISTRY[key][3] else LINEAR_TAP_COST * kernel_size)
+    fused_size = sum(kernel_size for _, kernel_size in group) - len(group) + 1
+    return LINEAR_PASS_COST + LINEAR_TAP_COST * fused_size
+
+
+def _group_linear(run: List[Step]) -> List[List[Step]]:
+    # Grupos contíguos de menor custo total; best[i] é (custo, grupos) de run[:i]
+    best = [(0.0, [])]
+    for end in range(1, len(run) + 1):
+        best.append(min(((best[start][0] + _linear_cost(run[start:end]), best[start][1] + [run[start:end]])
+                         for start in range(end)), key=lambda option: option[0]))
+    return best[-1][1]
+
+
+@lru_cache(maxsize=256)
+def compile_pipeline(steps: Tuple[Step, ...]) -> Tuple[Operation, ...]:
+    # Passos lineares separáveis consecutivos podem virar um único
+    # apply_separable_filter com a convolução dos kernels 1D: uma passada e
+    # sem arredondar para uint8 entre eles (pode diferir em 1 nível de
+    # cinza do encadeamento passo a passo). Os grupos seguem o custo
+    # estimado: médias grandes, de custo constante, costumam ficar separadas
+    operations = []
+    linear = []
+
+    def flush():
+        for group in _group_linear(linear):
+            if len(group) == 1:
+                key, kernel_size = group[0]
+                operations.append((FILTER_REGISTRY[key][1], kernel_size, ()))
+                continue
+            kernel = FILTER_REGISTRY[group[0][0]][2](group[0][1])
+            for key, kernel_size in group[1:]:
+                kernel = np.convolve(kernel, FILTER_REGISTRY[key][2](kernel_size))
+            # Kernel float32: o sepFilter2D com float64 é bem mais lento
+            operations.append((apply_separable_filter, len(kernel), (kernel.astype(np.float32),)))
+        linear.clear()
+
+    for key, kernel_size in steps:
+        if FILTER_REGISTRY[key][2] is not None:
+            linear.append((key, kernel_size))
+        else:
+            flush()
+            operations.append((FILTER_REGISTRY[key][1], kernel_size, ()))
+    flush()
+    return tuple(operations)
+
+
+def plan_pipelines(filters: Iterable[Tuple[str, Tuple[Step, ...]]],
+                   available: Iterable[Tuple[Step, ...]] = ()) -> List[Tuple[str, Tuple[Step, ...], int, tuple]]:
+    # Ordem de execução: (nome, passos, início, operações). Cada pipeline
+    # começa do maior prefixo já disponível ('median:3>gaussian:5' depois de
+    # 'median:3'); um prefixo que separaria dois passos lineares fundidos
+    # não é usado, para o resultado não depender dos outros filtros
+    def linear(step: Step) -> bool:
+        return FILTER_REGISTRY[step[0]][2] is not None
+
+    def reusable(prefix: Tuple[Step, ...], steps: Tuple[Step, ...]) -> bool:
+        size = len(prefix)
+        return (size < len(steps) and steps[:size] == prefix
+                and not (linear(steps[size - 1]) and linear(steps[size])))
+
+    done = set(available)
+    plans = []
+    for filter_name, steps in filters:
+        start = max((len(prefix) for prefix in done if reusable(prefix, steps)), default=0)
+        plans.append((filter_name, steps, start, compile_pipeline(steps[start:])))
+        done.add(steps)
+    return plans
+
+
+def shared_padding(pipelines: Iterable[Tuple[Operation, ...]], image: np.ndarray) -> Dict[str, Tuple[np.ndarray, int]]:
+    # Uma expansão da imagem por borda, com o maior halo, para a primeira
+    # operação dos pipelines executados em blocos (TileExecutor.run(padded=))
+    halos: Dict[str, int] = {}
+    counts: Dict[str, int] = {}
+    for operations in pipelines:
+        filter_func, kernel_size, _ = operations[0]
+        border = FILTER_BORDERS[filter_func]
+        halos[border] = max(halos.get(border, 0), kernel_size // 2)
+        counts[border] = counts.get(border, 0) + 1
+    return {border: (np.pad(image, halo, mode=border), halo) for border, halo in halos.items() if counts[border] > 1}
+
+
+def run_pipeline(operations: Tuple[Operation, ...], image: np.ndarray, executor: Optional[TileExecutor] = None,
+                 scratch: Optional[list] = None, padded: Optional[Dict[str, Tuple[np.ndarray, int]]] = None) -> np.ndarray:
+    # Executa as operações de compile_pipeline, em blocos pelo executor se
+    # houver. Intermediários alternam entre os dois buffers de scratch
+    # ([None, None], comum a todos os pipelines da imagem); só o resultado
+    # final é alocado. padded (de shared_padding) vale para a 1ª operação
+    current = image
+    last = len(operations) - 1
+    for i, (filter_func, kernel_size, args) in enumerate(operations):
+        out = None
+        if i < last and scratch is not None:
+            if scratch[i % 2] is None:
+                scratch[i % 2] = np.empty_like(image)
+            out = scratch[i % 2]
+        if executor is None:
+            current = filter_func(current, kernel_size, *args, out=out)
+            continue
+        shared = padded.get(FILTER_BORDERS[filter_func]) if padded and i == 0 else None
+        current = executor.run(filter_func, current, kernel_size, *args, out=out, padded=shared)
+    return current
@@ -1,113 +1,208 @@
 import cv2
 import numpy as np
-from scipy.stats import mode
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 import base64
-from io import BytesIO
-from PIL import Image
+
+import filters
+import noise
+from filters import DEFAULT_FILTER_SPEC, parse_filter, plan_pipelines, run_pipeline, shared_padding
+from metrics import compute_metrics, psnr_from_mse
+from result_cache import ResultCache, make_cache_key
+from tiling import TileExecutor
+from timing import NO_TIMER
+
+
+# Flags de decodificação por fator de redução da pré-visualização
+DECODE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+# Lado maior do nível mais grosso da pirâmide no modo progressivo
+PYRAMID_MIN_SIDE = 256
 
 
 class ImageProcessor:
 
-    def __init__(self):
-        self.filter_names = [
-            'Média 3x3', 'Média 7x7',
-            'Gaussiano 3x3', 'Gaussiano 7x7',
-            'Mediana 3x3', 'Mediana 7x7',
-            'Moda 3x3', 'Moda 7x7'
-        ]
+    def __init__(self, workers: Optional[int] = 1, use_processes: bool = False, cache: Optional[ResultCache] = None):
+        self.executor = TileExecutor(workers=workers, use_processes=use_processes)
+        self.cache = cache
+        # Filtros padrão, (nome, passos); outros pipelines podem ser pedidos
+        # pelo nome (veja filters.parse_pipeline_spec)
+        self.filters = filters.parse_pipeline_spec(DEFAULT_FILTER_SPEC)
+        self.filter_names = [name for name, _ in self.filters]
 
     @staticmethod
-    def add_salt_pepper_noise(image: np.ndarray, salt_prob: float = 0.02, pepper_prob: float = 0.02) -> np.ndarray:
-        noisy = image.copy()
-        salt_mask = np.random.random(image.shape) < salt_prob
-        noisy[salt_mask] = 255
-        pepper_mask = np.random.random(image.shape) < pepper_prob
-        noisy[pepper_mask] = 0
-        return noisy
+    def add_salt_pepper_noise(image: np.ndarray, salt_prob: float = 0.02, pepper_prob: float = 0.02,
+                              seed: Optional[int] = None) -> np.ndarray:
+        return noise.add_salt_pepper_noise(image, salt_prob=salt_prob, pepper_prob=pepper_prob, seed=seed)
 
     @staticmethod
-    def add_gaussian_noise(image: np.ndarray, mean: float = 0, sigma: float = 25) -> np.ndarray:
-        gaussian = np.random.normal(mean, sigma, image.shape)
-        noisy = image + gaussian
-        noisy = np.clip(noisy, 0, 255).astype(np.uint8)
-        return noisy
+    def add_gaussian_noise(image: np.ndarray, mean: float = 0, sigma: float = 25,
+                           seed: Optional[int] = None) -> np.ndarray:
+        return noise.add_gaussian_noise(image, mean=mean, sigma=sigma, seed=seed)
 
     @staticmethod
     def apply_mean_filter(image: np.ndarray, kernel_size: int = 3) -> np.ndarray:
-        return cv2.blur(image, (kernel_size, kernel_size))
+        return filters.apply_mean_filter(image, kernel_size)
 
     @staticmethod
     def apply_gaussian_filter(image: np.ndarray, kernel_size: int = 3) -> np.ndarray:
-        sigma = 0.3 * ((kernel_size - 1) * 0.5 - 1) + 0.8
-        return cv2.GaussianBlur(image, (kernel_size, kernel_size), sigma)
+        return filters.apply_gaussian_filter(image, kernel_size)
 
     @staticmethod
     def apply_median_filter(image: np.ndarray, kernel_size: int = 3) -> np.ndarray:
-        return cv2.medianBlur(image, kernel_size)
+        return filters.apply_median_filter(image, kernel_size)
 
     @staticmethod
     def apply_mode_filter(image: np.ndarray, kernel_size: int = 3) -> np.ndarray:
-        pad = kernel_size // 2
-        padded = np.pad(image, pad, mode='edge')
-        output = np.zeros_like(image)
-        for i in range(image.shape[0]):
-            for j in range(image.shape[1]):
-                window = padded[i:i+kernel_size, j:j+kernel_size]
-                output[i, j] = mode(window, axis=None, keepdims=False)[0]
-        return output.astype(np.uint8)
+        return filters.apply_mode_filter(image, kernel_size)
 
     @staticmethod
     def calculate_mse(original: np.ndarray, filtered: np.ndarray) -> float:
-        mse = np.mean((original.astype(float) - filtered.astype(float)) ** 2)
-        return float(mse)
+        return compute_metrics(original, {'filtered': filtered}, ssim=False)['filtered']['mse']
 
     @staticmethod
     def calculate_psnr(original: np.ndarray, filtered: np.ndarray) -> float:
-        mse = ImageProcessor.calculate_mse(original, filtered)
-        if mse == 0:
-            return float('inf')
-        max_pixel = 255.0
-        psnr = 20 * np.log10(max_pixel / np.sqrt(mse))
-        return float(psnr)
-
-    def process_image(self, original: np.ndarray, noisy: np.ndarray, progress_callback=None) -> Dict:
+        return psnr_from_mse(ImageProcessor.calculate_mse(original, filtered))
+
+    @staticmethod
+    def calculate_ssim(original: np.ndarray, filtered: np.ndarray) -> float:
+        return compute_metrics(original, {'filtered': filtered})['filtered']['ssim']
+
+    def noise_cache_key(self, original: np.ndarray, noise_type: str, salt_prob: float = 0.02,
+                        pepper_prob: float = 0.02, gaussian_sigma: float = 25, seed: Optional[int] = None) -> Optional[str]:
+        if self.cache is None:
+            return None
+        if noise_type == 'salt_pepper':
+            params = {'salt_prob': salt_prob, 'pepper_prob': pepper_prob}
+        else:
+            params = {'sigma': gaussian_sigma}
+        return make_cache_key(original, noise_type, params, seed)
+
+    def add_noise(self, original: np.ndarray, noise_type: str, salt_prob: float = 0.02, pepper_prob: float = 0.02,
+                  gaussian_sigma: float = 25, seed: Optional[int] = None, cache_key: Optional[str] = None,
+                  timer=NO_TIMER) -> np.ndarray:
+        if cache_key is not None:
+            entry = self.cache.get(f"{cache_key}|noisy")
+            if entry is not None:
+                return entry['image']
+
+        with timer.stage("noise") as stage:
+            if noise_type == 'salt_pepper':
+                noisy = self.add_salt_pepper_noise(original, salt_prob=salt_prob, pepper_prob=pepper_prob, seed=seed)
+            else:
+                noisy = self.add_gaussian_noise(original, sigma=gaussian_sigma, seed=seed)
+            stage.nbytes = noisy.nbytes
+
+        if cache_key is not None:
+            self.cache.put(f"{cache_key}|noisy", {'image': noisy})
+        return noisy
+
+    def apply_filters(self, filter_names, original: np.ndarray, noisy: np.ndarray, progress_callback=None,
+                      cache_key: Optional[str] = None, timer=NO_TIMER) -> Dict:
+        # Cada nome é um pipeline (parse_filter levanta ValueError se for
+        # inválido); um pipeline começa do maior prefixo já calculado
+        pipelines = [(filter_name, parse_filter(filter_name)) for filter_name in filter_names]
         results = {}
-        filters = [
-            ('Média 3x3', self.apply_mean_filter, 3),
-            ('Média 7x7', self.apply_mean_filter, 7),
-            ('Gaussiano 3x3', self.apply_gaussian_filter, 3),
-            ('Gaussiano 7x7', self.apply_gaussian_filter, 7),
-            ('Mediana 3x3', self.apply_median_filter, 3),
-            ('Mediana 7x7', self.apply_median_filter, 7),
-            ('Moda 3x3', self.apply_mode_filter, 3),
-            ('Moda 7x7', self.apply_mode_filter, 7),
-        ]
-
-        total = len(filters)
-        for idx, (filter_name, filter_func, kernel_size) in enumerate(filters):
+        filtered = {}
+        outputs = {}
+        pending = []
+        total = len(pipelines)
+        for idx, (filter_name, steps) in enumerate(pipelines):
+            if cache_key is not None:
+                entry = self.cache.get(f"{cache_key}|{filter_name}")
+                if entry is not None:
+                    if progress_callback:
+                        progress_callback(idx, total, filter_name)
+                    results[filter_name] = dict(entry, cached=True)
+                    outputs[steps] = entry['image']
+                    continue
+            pending.append((idx, filter_name, steps))
+
+        plans = plan_pipelines([(filter_name, steps) for _, filter_name, steps in pending], outputs)
+        # Buffers dos intermediários e, em blocos, a borda expandida uma vez
+        # para os pipelines que começam da imagem ruidosa
+        scratch = [None, None]
+        padded = None
+        if self.executor.splits(noisy):
+            padded = shared_padding([operations for _, _, start, operations in plans if start == 0], noisy)
+        for (idx, _, _), (filter_name, steps, start, operations) in zip(pending, plans):
             if progress_callback:
                 progress_callback(idx, total, filter_name)
-            filtered = filter_func(noisy, kernel_size)
-            mse = self.calculate_mse(original, filtered)
-            psnr = self.calculate_psnr(original, filtered)
-            results[filter_name] = {'image': filtered, 'mse': mse, 'psnr': psnr}
-        return results
+            with timer.stage(f"filter:{filter_name}") as stage:
+                if start:
+                    image = run_pipeline(operations, outputs[steps[:start]], self.executor, scratch)
+                else:
+                    image = run_pipeline(operations, noisy, self.executor, scratch, padded)
+                outputs[steps] = filtered[filter_name] = image
+                stage.nbytes = image.nbytes
+
+        # Métricas de todos os filtros numa única passada sobre a original
+        metrics = {}
+        if filtered:
+            with timer.stage("metrics"):
+                metrics = compute_metrics(original, filtered)
+        for filter_name, image in filtered.items():
+            result = {'image': image, **metrics[filter_name]}
+            if cache_key is not None:
+                self.cache.put(f"{cache_key}|{filter_name}", result)
+            results[filter_name] = dict(result, cached=False)
+        return {filter_name: results[filter_name] for filter_name in filter_names}
+
+    def apply_filter(self, filter_name: str, original: np.ndarray, noisy: np.ndarray,
+                     cache_key: Optional[str] = None, timer=NO_TIMER) -> Dict:
+        return self.apply_filters([filter_name], original, noisy, cache_key=cache_key, timer=timer)[filter_name]
+
+    def process_image(self, original: np.ndarray, noisy: np.ndarray, progress_callback=None,
+                      cache_key: Optional[str] = None, timer=NO_TIMER,
+                      filter_names: Optional[List[str]] = None) -> Dict:
+        return self.apply_filters(filter_names or self.filter_names, original, noisy, progress_callback, cache_key,
+                                  timer)
+
+    @staticmethod
+    def build_pyramid(image: np.ndarray, min_side: int = PYRAMID_MIN_SIDE) -> List[np.ndarray]:
+        # Níveis reduzidos (pyrDown, metade de cada lado por nível), do mais
+        # grosso ao mais fino, sem a própria imagem
+        levels = []
+        level = image
+        while max(level.shape[:2]) > min_side:
+            level = cv2.pyrDown(level)
+            levels.append(level)
+        return levels[::-1]
+
+    def process_level(self, original: np.ndarray, noise_type: str, salt_prob: float = 0.02,
+                      pepper_prob: float = 0.02, gaussian_sigma: float = 25, seed: Optional[int] = None,
+                      filter_names: Optional[List[str]] = None) -> Tuple[np.ndarray, Dict]:
+        # Ruído, filtros e métricas de um nível da pirâmide, sem cache: com
+        # os mesmos parâmetros de ruído, as métricas aproximam as da imagem
+        # inteira
+        noisy = self.add_noise(original, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed)
+        return noisy, self.process_image(original, noisy, filter_names=filter_names)
+
+    @staticmethod
+    def encode_png(image: np.ndarray) -> bytes:
+        ok, buffer = cv2.imencode('.png', image)
+        if not ok:
+            raise ValueError("Falha ao codificar a imagem em PNG")
+        return buffer.tobytes()
 
     @staticmethod
     def image_to_base64(image: np.ndarray) -> str:
-        pil_img = Image.fromarray(image)
-        buffer = BytesIO()
-        pil_img.save(buffer, format='PNG')
-        buffer.seek(0)
-        img_str = base64.b64encode(buffer.getvalue()).decode()
+        img_str = base64.b64encode(ImageProcessor.encode_png(image)).decode()
         return f"data:image/png;base64,{img_str}"
 
     @staticmethod
-    def load_image_from_bytes(image_bytes: bytes) -> np.ndarray:
+    def load_image_from_bytes(image_bytes: bytes, reduction: int = 1) -> np.ndarray:
+        # Decodifica direto em tons de cinza; com reduction 2, 4 ou 8 o
+        # decodificador já entrega a imagem reduzida (pré-visualização)
         nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = cv2.imdecode(nparr, DECODE_FLAGS[reduction])
+        if gray is None:
+            raise ValueError("Não foi possível decodificar a imagem")
         return gray
 
     def get_best_filter(self, results: Dict) -> Tuple[str, Dict]:
@@ -131,3 +226,4 @@ class ImageProcessor:
             'min_psnr': np.min(psnr_values),
             'max_psnr': np.max(psnr_values)
         }
+
@@ -0,0 +1,187 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    owner TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_images (
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    idx INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    metrics TEXT,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at);
+"""
+
+
+def aggregate_metrics(images: List[Dict]) -> Dict[str, Dict[str, float]]:
+    # Médias por filtro das imagens concluídas, como o metricas_media.csv
+    # do script
+    sums: Dict[str, Dict[str, float]] = {}
+    count = 0
+    for image in images:
+        if image["metrics"] is None:
+            continue
+        count += 1
+        for filter_name, metrics in image["metrics"].items():
+            totals = sums.setdefault(filter_name, {"mse": 0.0, "psnr": 0.0, "ssim": 0.0})
+            for metric in totals:
+                totals[metric] += metrics[metric]
+    return {filter_name: {metric: total / count for metric, total in totals.items()}
+            for filter_name, totals in sums.items()}
+
+
+class JobStore:
+    """
+    Fila persistente dos jobs em lote (/api/jobs) num arquivo SQLite local.
+
+    Um job passa por queued -> running -> done/failed; cada imagem guarda seu
+    próprio estado e métricas, então um job interrompido por um reinício
+    continua das imagens que faltavam. Vários processos (workers do uvicorn)
+    podem compartilhar o arquivo: `claim` garante que cada job rode em um só.
+
+    O dono de um job em execução é um token sorteado por instância (o PID
+    se repete após um reinício em contêiner) e o job fica com ele enquanto
+    `heartbeat` renovar updated_at dentro de `lease` segundos.
+    """
+
+    def __init__(self, path: str, lease: float = 60.0):
+        self.path = path
+        self.lease = lease
+        self.token = str(uuid.uuid4())
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def create(self, job_id: str, params: Dict, images: List[Tuple[str, str]]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(params), now, now),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_images (job_id, idx, filename, path, status) VALUES (?, ?, ?, ?, 'queued')",
+                [(job_id, idx, filename, path) for idx, (filename, path) in enumerate(images)],
+            )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT idx, filename, status, metrics, error FROM job_images WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+        images = [{
+            "index": row["idx"],
+            "filename": row["filename"],
+            "status": row["status"],
+            "metrics": json.loads(row["metrics"]) if row["metrics"] else None,
+            "error": row["error"],
+        } for row in rows]
+        return {
+            "id": job["id"],
+            "status": job["status"],
+            "params": json.loads(job["params"]),
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "images": images,
+        }
+
+    def next_queued(self) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+        return row["id"] if row else None
+
+    def claim(self, job_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+                (self.token, time.time(), job_id),
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str) -> bool:
+        # Renova o lease; False se o job não é mais desta instância
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running' AND owner = ?",
+                (time.time(), job_id, self.token),
+            )
+            return cursor.rowcount == 1
+
+    def requeue_orphans(self) -> int:
+        # Jobs "running" de outra instância com o lease vencido (reinício ou
+        # queda) voltam para a fila; as imagens já concluídas são mantidas
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ? "
+                "WHERE status = 'running' AND (owner IS NULL OR owner != ?) AND updated_at < ?",
+                (now, self.token, now - self.lease),
+            )
+            return cursor.rowcount
+
+    def pending_images(self, job_id: str) -> List[Tuple[int, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, path FROM job_images WHERE job_id = ? AND status = 'queued' ORDER BY idx", (job_id,)
+            ).fetchall()
+        return [(row["idx"], row["path"]) for row in rows]
+
+    def finish_image(self, job_id: str, idx: int, metrics: Optional[Dict] = None, error: Optional[str] = None) -> int:
+        # Só o dono grava o resultado; 0 se o job não é mais desta instância
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            cursor = self._conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running' AND owner = ?",
+                (time.time(), job_id, self.token),
+            )
+            if cursor.rowcount == 0:
+                return 0
+            cursor = self._conn.execute(
+                "UPDATE job_images SET status = ?, metrics = ?, error = ? WHERE job_id = ? AND idx = ?",
+                ("failed" if error else "done", json.dumps(metrics) if metrics is not None else None, error,
+                 job_id, idx),
+            )
+            return cursor.rowcount
+
+    def finish(self, job_id: str, error: Optional[str] = None) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND owner = ?",
+                ("failed" if error else "done", error, time.time(), job_id, self.token),
+            )
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
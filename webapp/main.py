@@ -1,19 +1,196 @@
 from fastapi import FastAPI, File, UploadFile, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+import asyncio
+import base64
+import hashlib
+import multiprocessing
 import os
 import json
+import shutil
+import time
+import uuid
+import zipfile
 from datetime import datetime
 import numpy as np
-import pandas as pd
-import plotly.graph_objects as go
 from pathlib import Path
+from typing import List, Optional
+from urllib.parse import quote
+
+import aiofiles
+
+from admission import AdmissionController, QueueFull, estimate_cost
+from charts import chart_series, plotly_charts_json
+from filters import parse_filter_names
+from image_processor import DECODE_FLAGS, ImageProcessor
+from job_store import JobStore, aggregate_metrics
+import monitoring
+from session_store import SessionStore
+from timing import NO_TIMER, StageTimer, server_timing_header, timings_json
+from worker import (
+    init_worker, run_batch_image_job, run_filter_job, run_noise_job, run_preview_level_job, run_processing_job,
+)
 
-from image_processor import ImageProcessor
-
-app = FastAPI(title="Processamento de Imagens - Filtros Espaciais")
+# Pool que executa ruído, filtros e codificação fora do event loop:
+# "process" (padrão) ou "thread"
+WORKER_POOL = os.environ.get("WORKER_POOL", "process")
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", 2))
+# Tempo máximo (s) de um /api/process antes de o job ser cancelado
+PROCESS_TIMEOUT = float(os.environ.get("PROCESS_TIMEOUT", 120))
+# Número de threads usadas para processar cada filtro em blocos
+FILTER_WORKERS = int(os.environ.get("FILTER_WORKERS", max(1, (os.cpu_count() or 1) // WORKER_POOL_SIZE)))
+# Memória máxima (MB) ocupada pelas imagens das sessões e tempo (s) de
+# inatividade até uma sessão expirar
+SESSION_MAX_MB = float(os.environ.get("SESSION_MAX_MB", 512))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", 1800))
+# Cache de resultados (por worker) e camada opcional em disco, compartilhada
+CACHE_MAX_MB = float(os.environ.get("CACHE_MAX_MB", 256))
+CACHE_DIR = os.environ.get("CACHE_DIR") or None
+CACHE_DISK_MAX_MB = float(os.environ.get("CACHE_DISK_MAX_MB", 2048))
+
+# Tempos por etapa (Server-Timing e campo "timings"); "0" desativa
+STAGE_TIMINGS = os.environ.get("STAGE_TIMINGS", "1") != "0"
+# Endpoint /metrics (Prometheus); com vários workers do uvicorn, defina
+# também PROMETHEUS_MULTIPROC_DIR
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+# Os jobs medem as etapas se algum dos dois precisar delas
+COLLECT_TIMINGS = STAGE_TIMINGS or METRICS_ENABLED
+
+# Tamanho máximo (MB) de um arquivo em /api/upload e se o arquivo enviado é
+# gravado em uploads/ (a sessão só precisa da imagem decodificada)
+UPLOAD_MAX_MB = float(os.environ.get("UPLOAD_MAX_MB", 50))
+UPLOAD_SAVE = os.environ.get("UPLOAD_SAVE", "1") != "0"
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+# Controle de admissão de /api/process e /api/process/stream: custo
+# estimado (ms) em andamento, pedidos na fila e espera máxima (s) na fila
+ADMISSION_CAPACITY = float(os.environ.get("ADMISSION_CAPACITY", 2000 * WORKER_POOL_SIZE))
+ADMISSION_QUEUE = int(os.environ.get("ADMISSION_QUEUE", 8))
+ADMISSION_TIMEOUT = float(os.environ.get("ADMISSION_TIMEOUT", 30))
+
+# Jobs em lote (/api/jobs): banco SQLite da fila, intervalo (s) com que
+# cada processo procura jobs enviados a outros workers do uvicorn, lease (s)
+# de um job em execução (depois disso, sem renovação, outro processo o
+# retoma), tamanho máximo (MB) do envio e das imagens extraídas dos ZIPs e
+# número máximo de imagens por job
+JOBS_DB = os.environ.get("JOBS_DB") or str(Path(__file__).resolve().parent / "jobs.sqlite3")
+JOBS_POLL_INTERVAL = float(os.environ.get("JOBS_POLL_INTERVAL", 5))
+JOBS_LEASE = float(os.environ.get("JOBS_LEASE", 60))
+JOBS_MAX_MB = float(os.environ.get("JOBS_MAX_MB", 500))
+JOBS_MAX_FILES = int(os.environ.get("JOBS_MAX_FILES", 1000))
+
+worker_pool = None
+# Acertos e falhas do cache de resultados, somados a partir dos jobs
+cache_stats = {"hits": 0, "misses": 0}
+
+def create_worker_pool():
+    initargs = (
+        FILTER_WORKERS,
+        int(CACHE_MAX_MB * 1024 * 1024),
+        CACHE_DIR,
+        int(CACHE_DISK_MAX_MB * 1024 * 1024),
+    )
+    if WORKER_POOL == "process":
+        try:
+            return ProcessPoolExecutor(
+                max_workers=WORKER_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=initargs,
+            )
+        except (OSError, NotImplementedError):
+            pass
+    return ThreadPoolExecutor(max_workers=WORKER_POOL_SIZE, initializer=init_worker, initargs=initargs)
+
+def count_cache_result(result: dict):
+    cache_stats["hits" if result.get("cached") else "misses"] += 1
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global worker_pool
+    worker_pool = create_worker_pool()
+    await asyncio.to_thread(jobs.requeue_orphans)
+    dispatcher = asyncio.create_task(dispatch_jobs())
+    yield
+    dispatcher.cancel()
+    worker_pool.shutdown(cancel_futures=True)
+    monitoring.mark_process_dead()
+
+app = FastAPI(title="Processamento de Imagens - Filtros Espaciais", lifespan=lifespan)
+
+class UploadSizeLimit:
+    # Limita o corpo de /api/upload e /api/jobs enquanto ele chega: recusa
+    # pelo Content-Length antes de ler e, sem ele (ou se for falso), conta
+    # os bytes das mensagens http.request e interrompe a leitura assim que
+    # passar do limite, antes de o multipart gravar o resto em disco. A
+    # resposta de erro que a rota der nesse caso é trocada pelo 413.
+    # Middleware ASGI puro: não repassa a resposta por uma fila como o
+    # @app.middleware("http")
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit_mb = UPLOAD_LIMITS_MB.get(scope["path"]) if scope["type"] == "http" else None
+        if limit_mb is None:
+            await self.app(scope, receive, send)
+            return
+        max_bytes = limit_mb * 1024 * 1024
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > max_bytes:
+            await upload_too_large_response(limit_mb)(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded and not started:
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            pass
+        if exceeded and not started:
+            await upload_too_large_response(limit_mb)(scope, receive, send)
+
+app.add_middleware(UploadSizeLimit)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Rota pelo molde ("/api/image/{session_id}/{image_name}"), não pela URL,
+    # para não criar uma série por sessão
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    status = str(response.status_code)
+    monitoring.REQUEST_LATENCY.labels(request.method, route, status).observe(time.perf_counter() - start)
+    if response.status_code >= 400:
+        monitoring.ERRORS.labels(route, status).inc()
+    monitoring.update_session_gauges(sessions.stats())
+    return response
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,14 +206,27 @@ RESULTS_DIR = BASE_DIR / "results"
 STATIC_DIR = BASE_DIR / "static"
 TEMPLATES_DIR = BASE_DIR / "templates"
 
+JOBS_DIR = UPLOAD_DIR / "jobs"
+
 UPLOAD_DIR.mkdir(exist_ok=True)
 RESULTS_DIR.mkdir(exist_ok=True)
+JOBS_DIR.mkdir(exist_ok=True)
 
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 processor = ImageProcessor()
-sessions = {}
+sessions = SessionStore(max_bytes=int(SESSION_MAX_MB * 1024 * 1024), ttl=SESSION_TTL)
+jobs = JobStore(JOBS_DB, lease=JOBS_LEASE)
+admission = AdmissionController(
+    ADMISSION_CAPACITY, ADMISSION_QUEUE, parallelism=WORKER_POOL_SIZE,
+    on_change=monitoring.update_admission_gauges if METRICS_ENABLED else None
+)
+# Acordado quando um job é criado neste processo
+jobs_wakeup = asyncio.Event()
+
+JOB_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+NOISE_TYPES = ('salt_pepper', 'gaussian')
 
 STUDENT_INFO = {
     "nome": "Ryan Oliveira",
@@ -49,6 +239,275 @@ STUDENT_INFO = {
     "data_entrega": "2025-12-03"
 }
 
+def submit_to_worker_pool(func, *args) -> asyncio.Future:
+    global worker_pool
+    try:
+        future = worker_pool.submit(func, *args)
+    except BrokenProcessPool:
+        worker_pool = create_worker_pool()
+        future = worker_pool.submit(func, *args)
+    return asyncio.wrap_future(future)
+
+async def run_in_worker_pool(func, *args):
+    future = submit_to_worker_pool(func, *args)
+    try:
+        return await asyncio.wait_for(future, timeout=PROCESS_TIMEOUT)
+    finally:
+        # Se ainda estiver na fila, o job nunca começa; se já estiver rodando,
+        # ele aborta sozinho no próximo ponto de verificação do prazo
+        future.cancel()
+
+def image_entry(png: bytes) -> dict:
+    return {"png": png, "etag": hashlib.blake2b(png, digest_size=8).hexdigest()}
+
+def timed_response(data, stages):
+    if not STAGE_TIMINGS or not stages:
+        return JSONResponse(data)
+    data["timings"] = timings_json(stages)
+    return JSONResponse(data, headers={"Server-Timing": server_timing_header(stages)})
+
+def resolve_filters(filters: Optional[str]) -> List[str]:
+    # Especificação de filtros do pedido, como 'mean:3, median:3>gaussian:5'
+    # (veja filters.parse_pipeline_spec); vazia = filtros padrão. Levanta
+    # ValueError se for inválida
+    if filters is None or not filters.strip():
+        return processor.filter_names
+    return parse_filter_names(filters)
+
+async def admit(original: np.ndarray, filter_names: List[str], progressive: bool = False):
+    # Ocupa a capacidade pelo custo da imagem com os filtros pedidos (+1/3,
+    # o máximo dos níveis da pirâmide, no modo progressivo); levanta
+    # QueueFull se a fila estiver cheia ou a espera passar do limite
+    cost = estimate_cost(original.shape, filter_names)
+    if progressive:
+        cost *= 4 / 3
+    try:
+        return await admission.acquire(cost, ADMISSION_TIMEOUT)
+    except QueueFull as e:
+        if METRICS_ENABLED:
+            monitoring.ADMISSION_REJECTED.labels(e.reason).inc()
+        raise
+
+def busy_response(error: QueueFull) -> JSONResponse:
+    return JSONResponse({"success": False, "error": str(error), "retry_after": error.retry_after},
+                        status_code=429, headers={"Retry-After": str(error.retry_after)})
+
+def record_stream_error(reason: str):
+    # Erros do stream chegam como eventos, com a resposta já em 200
+    if METRICS_ENABLED:
+        monitoring.ERRORS.labels("/api/process/stream", reason).inc()
+
+def png_data_url(png: bytes) -> str:
+    return f"data:image/png;base64,{base64.b64encode(png).decode()}"
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def image_url(session_id: str, image_name: str, entry: dict) -> str:
+    # A versão na URL muda a cada processamento, então o navegador pode
+    # guardar a imagem em cache sem risco de mostrar um resultado antigo
+    return f"/api/image/{session_id}/{quote(image_name)}?v={entry['etag']}"
+
+# Tamanho máximo (MB) do corpo das rotas que recebem arquivos
+UPLOAD_LIMITS_MB = {"/api/upload": UPLOAD_MAX_MB, "/api/jobs": JOBS_MAX_MB}
+
+class UploadTooLarge(Exception):
+    pass
+
+class JobTooLarge(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+def upload_too_large_response(limit_mb: float = UPLOAD_MAX_MB) -> JSONResponse:
+    return JSONResponse({"success": False, "error": f"Arquivo maior que o limite de {limit_mb:g} MB"},
+                        status_code=413)
+
+async def read_upload(file: UploadFile, file_path: Optional[Path] = None) -> bytearray:
+    # Lê o upload em blocos para um único buffer (pré-alocado quando o
+    # tamanho é conhecido); com file_path, cada bloco também é gravado em
+    # disco sem bloquear o loop. O corpo da requisição já foi limitado em
+    # UploadSizeLimit; aqui o limite vale para o arquivo em si
+    max_bytes = int(UPLOAD_MAX_MB * 1024 * 1024)
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge()
+    buffer = bytearray(file.size or 0)
+    received = 0
+    out = await aiofiles.open(file_path, "wb") if file_path is not None else None
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            if received + len(chunk) > max_bytes:
+                raise UploadTooLarge()
+            buffer[received:received + len(chunk)] = chunk
+            received += len(chunk)
+            if out is not None:
+                await out.write(chunk)
+    except BaseException:
+        if out is not None:
+            await out.close()
+            out = None
+            file_path.unlink(missing_ok=True)
+        raise
+    finally:
+        if out is not None:
+            await out.close()
+    del buffer[received:]
+    return buffer
+
+def decode_upload(content: bytearray, timer, reduction: int = 1) -> tuple:
+    # Decodifica direto do buffer do upload (np.frombuffer, sem cópia)
+    with timer.stage("decode") as stage:
+        original = processor.load_image_from_bytes(content, reduction)
+        stage.nbytes = original.nbytes
+    with timer.stage("png:original") as stage:
+        original_png = image_entry(processor.encode_png(original))
+        stage.nbytes = len(original_png["png"])
+    return original, original_png
+
+async def load_full_resolution(session_id: str, session: dict) -> Optional[dict]:
+    # Sessão aberta em pré-visualização: decodifica o arquivo enviado em
+    # resolução total e descarta as imagens da pré-visualização; None se a
+    # sessão expirou ou foi descartada durante a decodificação
+    if session.get("reduction", 1) == 1:
+        return session
+    original, original_png = await asyncio.to_thread(decode_upload, session["source"], NO_TIMER)
+    if not sessions.update(session_id, original=original, images={"original": original_png}, reduction=1,
+                           source=None, processed=False):
+        return None
+    return session
+
+def round_metrics(metrics: dict) -> dict:
+    return {filter_name: {metric: round(value, 4) for metric, value in values.items()}
+            for filter_name, values in metrics.items()}
+
+def save_job_files(job_dir: Path, uploads: List[UploadFile]) -> List[tuple]:
+    # Grava as imagens do job em disco (para sobreviverem a um reinício):
+    # arquivos soltos na ordem de envio e, de cada ZIP, as imagens em ordem
+    # alfabética, como o --input-dir do script. O total de imagens e de
+    # bytes (tamanho declarado no ZIP, que o zipfile não deixa ultrapassar)
+    # é conferido antes de extrair cada arquivo
+    job_dir.mkdir(parents=True)
+    images = []
+    total_bytes = 0
+
+    def reserve(count: int, nbytes: int):
+        nonlocal total_bytes
+        total_bytes += nbytes
+        if len(images) + count > JOBS_MAX_FILES:
+            raise JobTooLarge(f"Mais de {JOBS_MAX_FILES} imagens no job", 400)
+        if total_bytes > JOBS_MAX_MB * 1024 * 1024:
+            raise JobTooLarge(f"Imagens do job maiores que o limite de {JOBS_MAX_MB:g} MB", 413)
+
+    def store(name: str, source):
+        path = job_dir / f"{len(images):05d}_{Path(name).name}"
+        with open(path, "wb") as f:
+            shutil.copyfileobj(source, f)
+        images.append((name, str(path)))
+
+    for upload in uploads:
+        name = upload.filename or "imagem"
+        if not name.lower().endswith(".zip"):
+            reserve(1, upload.size or 0)
+            store(name, upload.file)
+            continue
+        with zipfile.ZipFile(upload.file) as archive:
+            members = sorted(
+                (member for member in archive.infolist()
+                 if member.filename.lower().endswith(JOB_IMAGE_EXTENSIONS)
+                 and not member.filename.startswith("__MACOSX/")),
+                key=lambda member: member.filename
+            )
+            reserve(len(members), sum(member.file_size for member in members))
+            for member in members:
+                with archive.open(member) as source:
+                    store(member.filename, source)
+    return images
+
+async def run_batch_job(job_id: str):
+    # O SQLite pode esperar pelo lock de escrita de outro processo: todas
+    # as chamadas a `jobs` rodam numa thread, fora do event loop
+    params = (await asyncio.to_thread(jobs.get, job_id))["params"]
+    pending = list(reversed(await asyncio.to_thread(jobs.pending_images, job_id)))
+    running = {}
+    renewed = time.monotonic()
+    try:
+        while pending or running:
+            # No máximo uma imagem por worker em andamento: as requisições
+            # interativas esperam, no pior caso, uma imagem do lote
+            while pending and len(running) < WORKER_POOL_SIZE:
+                idx, path = pending.pop()
+                future = submit_to_worker_pool(
+                    run_batch_image_job, path, params["noise_type"], params["salt_prob"], params["pepper_prob"],
+                    params["gaussian_sigma"], params["filters"], params["seed"] + idx,
+                    time.time() + PROCESS_TIMEOUT, METRICS_ENABLED
+                )
+                running[future] = idx
+
+            # Renova o lease mesmo com imagens demoradas; se outro processo
+            # retomou o job (lease vencido), este para de processá-lo e deixa
+            # os arquivos para o novo dono
+            finished, _ = await asyncio.wait(set(running), timeout=JOBS_LEASE / 3,
+                                             return_when=asyncio.FIRST_COMPLETED)
+            if time.monotonic() - renewed >= JOBS_LEASE / 3:
+                if not await asyncio.to_thread(jobs.heartbeat, job_id):
+                    return
+                renewed = time.monotonic()
+            for future in finished:
+                idx = running.pop(future)
+                try:
+                    metrics, stages = future.result()
+                except Exception as e:
+                    if not await asyncio.to_thread(jobs.finish_image, job_id, idx,
+                                                   error=str(e) or type(e).__name__):
+                        return
+                    if METRICS_ENABLED:
+                        monitoring.ERRORS.labels("/api/jobs", "image").inc()
+                    continue
+                if not await asyncio.to_thread(jobs.finish_image, job_id, idx, metrics=metrics):
+                    return
+                if METRICS_ENABLED:
+                    monitoring.IMAGES_PROCESSED.labels("job").inc()
+                    monitoring.observe_stages(stages)
+    finally:
+        # Lease perdido, erro ou encerramento: descarta as imagens que faltam
+        for future in running:
+            future.cancel()
+
+    images = (await asyncio.to_thread(jobs.get, job_id))["images"]
+    error = None if any(image["status"] == "done" for image in images) else "Nenhuma imagem foi processada"
+    # Sem o lease, os arquivos ficam para a instância que retomou o job
+    if await asyncio.to_thread(jobs.finish, job_id, error=error):
+        await asyncio.to_thread(shutil.rmtree, JOBS_DIR / job_id, True)
+
+async def dispatch_jobs():
+    # Executa os jobs em lote em ordem de criação, um de cada vez; outros
+    # processos do uvicorn compartilham a fila e `claim` evita duplicidade;
+    # sem jobs na fila, retoma os de processos que pararam de renovar o lease
+    while True:
+        job_id = await asyncio.to_thread(jobs.next_queued)
+        if job_id is None:
+            if await asyncio.to_thread(jobs.requeue_orphans):
+                continue
+            try:
+                await asyncio.wait_for(jobs_wakeup.wait(), timeout=JOBS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            jobs_wakeup.clear()
+            continue
+        if not await asyncio.to_thread(jobs.claim, job_id):
+            continue
+        try:
+            await run_batch_job(job_id)
+        except asyncio.CancelledError:
+            # Encerramento do servidor: o job volta à fila quando o lease
+            # vencer, neste ou em outro processo
+            raise
+        except Exception as e:
+            await asyncio.to_thread(jobs.finish, job_id, error=str(e))
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request, "student_info": STUDENT_INFO})
@@ -62,33 +521,48 @@ async def demo(request: Request):
     return templates.TemplateResponse("demo.html", {"request": request, "student_info": STUDENT_INFO})
 
 @app.post("/api/upload")
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(file: UploadFile = File(...), preview: int = Form(1)):
     try:
+        # preview 2, 4 ou 8 decodifica a imagem já reduzida; /api/process
+        # com full_resolution=true passa depois para a resolução total
+        if preview not in DECODE_FLAGS:
+            return JSONResponse({"success": False, "error": "Redução de pré-visualização inválida (1, 2, 4 ou 8)"},
+                                status_code=400)
         session_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        file_path = UPLOAD_DIR / f"{session_id}_{file.filename}"
-        content = await file.read()
-
-        with open(file_path, "wb") as f:
-            f.write(content)
+        file_path = UPLOAD_DIR / f"{session_id}_{file.filename}" if UPLOAD_SAVE else None
+        content = await read_upload(file, file_path)
 
-        original = processor.load_image_from_bytes(content)
-        original_b64 = processor.image_to_base64(original)
+        # Decodificação e PNG rodam numa thread, fora do event loop
+        timer = StageTimer() if COLLECT_TIMINGS else NO_TIMER
+        original, original_png = await asyncio.to_thread(decode_upload, content, timer, preview)
 
         sessions[session_id] = {
             "original": original,
+            "images": {"original": original_png},
             "filename": file.filename,
             "upload_time": datetime.now().isoformat(),
-            "processed": False
+            "processed": False,
+            "reduction": preview,
+            # Arquivo enviado, guardado só para a resolução total posterior
+            "source": bytes(content) if preview > 1 else None
         }
+        del content
 
-        return JSONResponse({
+        response_data = {
             "success": True,
             "session_id": session_id,
             "filename": file.filename,
-            "image": original_b64,
-            "shape": original.shape
-        })
+            "image": image_url(session_id, "original", original_png),
+            "shape": original.shape,
+            "reduction": preview
+        }
+        if METRICS_ENABLED:
+            monitoring.UPLOADS.inc()
+            monitoring.observe_stages(timer.stages)
+        return timed_response(response_data, timer.stages)
 
+    except UploadTooLarge:
+        return upload_too_large_response()
     except Exception as e:
         return JSONResponse({"success": False, "error": str(e)}, status_code=500)
 
@@ -98,95 +572,277 @@ async def process_image(
     noise_type: str = Form(...),
     salt_prob: float = Form(0.02),
     pepper_prob: float = Form(0.02),
-    gaussian_sigma: float = Form(25.0)
+    gaussian_sigma: float = Form(25.0),
+    seed: Optional[int] = Form(None),
+    full_resolution: bool = Form(False),
+    filters: Optional[str] = Form(None)
 ):
     try:
         if session_id not in sessions:
             return JSONResponse({"success": False, "error": "Sessão não encontrada"}, status_code=404)
-
-        original = sessions[session_id]["original"]
-
-        if noise_type == "salt_pepper":
-            noisy = processor.add_salt_pepper_noise(original, salt_prob=salt_prob, pepper_prob=pepper_prob)
-        else:
-            noisy = processor.add_gaussian_noise(original, sigma=gaussian_sigma)
-
-        results = processor.process_image(original, noisy)
-        stats = processor.get_summary_stats(results)
+        try:
+            filter_names = resolve_filters(filters)
+        except ValueError as e:
+            return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+
+        session = sessions[session_id]
+        if full_resolution:
+            session = await load_full_resolution(session_id, session)
+            if session is None:
+                return JSONResponse({"success": False, "error": "Sessão expirada"}, status_code=404)
+        original = session["original"]
+
+        ticket = await admit(original, filter_names)
+        try:
+            job = await run_in_worker_pool(
+                run_processing_job, original, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed,
+                time.time() + PROCESS_TIMEOUT, COLLECT_TIMINGS, filter_names
+            )
+        finally:
+            ticket.release()
+        results = job["results"]
+        stats = job["stats"]
+
+        images = {"original": session["images"]["original"]}
+        for image_name, png in job["pngs"].items():
+            images[image_name] = image_entry(png)
 
         response_data = {
             "success": True,
             "session_id": session_id,
             "noise_type": noise_type,
-            "noisy_image": processor.image_to_base64(noisy),
+            "shape": original.shape,
+            "reduction": session.get("reduction", 1),
+            "original_image": image_url(session_id, "original", images["original"]),
+            "noisy_image": image_url(session_id, "noisy", images["noisy"]),
             "stats": stats,
             "filters": {}
         }
 
         for filter_name, data in results.items():
+            count_cache_result(data)
             response_data["filters"][filter_name] = {
-                "image": processor.image_to_base64(data['image']),
+                "image": image_url(session_id, filter_name, images[filter_name]),
                 "mse": round(data['mse'], 4),
-                "psnr": round(data['psnr'], 4)
+                "psnr": round(data['psnr'], 4),
+                "ssim": round(data['ssim'], 4),
+                "cached": data['cached']
             }
 
-        sessions[session_id]["results"] = results
-        sessions[session_id]["noisy"] = noisy
-        sessions[session_id]["noise_type"] = noise_type
-        sessions[session_id]["stats"] = stats
-        sessions[session_id]["processed"] = True
-
-        return JSONResponse(response_data)
-
+        stored = sessions.update(
+            session_id, results=results, images=images, noise_type=noise_type, stats=stats,
+            charts=chart_series(results), charts_json=None, processed=True
+        )
+        if not stored:
+            return JSONResponse({"success": False, "error": "Sessão expirada"}, status_code=404)
+
+        if METRICS_ENABLED:
+            monitoring.IMAGES_PROCESSED.labels("batch").inc()
+            monitoring.observe_stages(job["timings"])
+        return timed_response(response_data, job["timings"])
+
+    except QueueFull as e:
+        return busy_response(e)
+    except (asyncio.TimeoutError, TimeoutError):
+        return JSONResponse({"success": False, "error": "Tempo limite de processamento excedido"}, status_code=504)
     except Exception as e:
         return JSONResponse({"success": False, "error": str(e)}, status_code=500)
 
+@app.post("/api/process/stream")
+async def process_image_stream(
+    session_id: str = Form(...),
+    noise_type: str = Form(...),
+    salt_prob: float = Form(0.02),
+    pepper_prob: float = Form(0.02),
+    gaussian_sigma: float = Form(25.0),
+    seed: Optional[int] = Form(None),
+    full_resolution: bool = Form(False),
+    progressive: bool = Form(False),
+    filters: Optional[str] = Form(None)
+):
+    session = sessions.get(session_id)
+    if session is None:
+        return JSONResponse({"success": False, "error": "Sessão não encontrada"}, status_code=404)
+    try:
+        filter_names = resolve_filters(filters)
+    except ValueError as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+    if full_resolution:
+        try:
+            session = await load_full_resolution(session_id, session)
+        except Exception as e:
+            return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+        if session is None:
+            return JSONResponse({"success": False, "error": "Sessão expirada"}, status_code=404)
+    original = session["original"]
+    try:
+        ticket = await admit(original, filter_names, progressive)
+    except QueueFull as e:
+        return busy_response(e)
+    deadline = time.time() + PROCESS_TIMEOUT
+
+    # Um novo stream da mesma sessão (o usuário mudou os parâmetros)
+    # interrompe este no próximo nível ou filtro
+    generation = session.get("generation", 0) + 1
+    sessions.update(session_id, generation=generation)
+
+    def superseded() -> bool:
+        return session.get("generation") != generation
+
+    async def events():
+        futures = []
+        try:
+            if progressive:
+                # Níveis reduzidos da pirâmide primeiro, do mais grosso ao
+                # mais fino: saídas e métricas aproximadas em poucos ms
+                levels = await asyncio.to_thread(processor.build_pyramid, original)
+                for index, level in enumerate(levels):
+                    if superseded():
+                        yield sse_event("cancelled", {"session_id": session_id})
+                        return
+                    preview = await run_in_worker_pool(
+                        run_preview_level_job, level, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed,
+                        deadline, filter_names
+                    )
+                    yield sse_event("level", {
+                        "noise_type": noise_type,
+                        "level": index,
+                        "levels": len(levels) + 1,
+                        "downscale": 2 ** (len(levels) - index),
+                        "shape": level.shape,
+                        "noisy_image": png_data_url(preview["noisy"]),
+                        "filters": {
+                            filter_name: {
+                                "image": png_data_url(data["png"]),
+                                "mse": round(data['mse'], 4),
+                                "psnr": round(data['psnr'], 4),
+                                "ssim": round(data['ssim'], 4)
+                            }
+                            for filter_name, data in preview["filters"].items()
+                        }
+                    })
+                if superseded():
+                    yield sse_event("cancelled", {"session_id": session_id})
+                    return
+
+            noisy, noisy_png, cache_key = await run_in_worker_pool(
+                run_noise_job, original, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed, deadline
+            )
+            images = {"original": session["images"]["original"], "noisy": image_entry(noisy_png)}
+            yield sse_event("noisy", {
+                "session_id": session_id,
+                "noise_type": noise_type,
+                "shape": original.shape,
+                "reduction": session.get("reduction", 1),
+                "original_image": image_url(session_id, "original", images["original"]),
+                "image": image_url(session_id, "noisy", images["noisy"])
+            })
+
+            # Cada filtro é um job separado; os resultados saem na ordem em
+            # que terminam, então os filtros rápidos aparecem primeiro
+            futures = [
+                submit_to_worker_pool(run_filter_job, original, noisy, filter_name, cache_key, deadline,
+                                      METRICS_ENABLED)
+                for filter_name in filter_names
+            ]
+            finished = {}
+            for next_result in asyncio.as_completed(futures, timeout=max(0.0, deadline - time.time())):
+                filter_name, data, png, stages = await next_result
+                if superseded():
+                    yield sse_event("cancelled", {"session_id": session_id})
+                    return
+                if METRICS_ENABLED:
+                    monitoring.observe_stages(stages)
+                finished[filter_name] = data
+                images[filter_name] = image_entry(png)
+                count_cache_result(data)
+                yield sse_event("filter", {
+                    "name": filter_name,
+                    "image": image_url(session_id, filter_name, images[filter_name]),
+                    "mse": round(data['mse'], 4),
+                    "psnr": round(data['psnr'], 4),
+                    "ssim": round(data['ssim'], 4),
+                    "cached": data['cached']
+                })
+
+            results = {filter_name: finished[filter_name] for filter_name in filter_names}
+            stats = processor.get_summary_stats(results)
+            stored = sessions.update(
+                session_id, results=results, images=images, noise_type=noise_type, stats=stats,
+                charts=chart_series(results), charts_json=None, processed=True
+            )
+            if not stored:
+                record_stream_error("expired")
+                yield sse_event("error", {"error": "Sessão expirada"})
+                return
+            if METRICS_ENABLED:
+                monitoring.IMAGES_PROCESSED.labels("stream").inc()
+            yield sse_event("done", {"session_id": session_id, "stats": stats})
+
+        except (asyncio.TimeoutError, TimeoutError):
+            record_stream_error("timeout")
+            yield sse_event("error", {"error": "Tempo limite de processamento excedido"})
+        except Exception as e:
+            record_stream_error("exception")
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            # Cliente desconectado, erro ou prazo esgotado: descarta o que faltar
+            for future in futures:
+                future.cancel()
+            ticket.release()
+
+    # A tarefa de fundo libera a capacidade mesmo se o stream nunca começar
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release)
+    )
+
+@app.get("/api/image/{session_id}/{image_name}")
+async def get_image(request: Request, session_id: str, image_name: str):
+    session = sessions.get(session_id)
+    if session is None or image_name not in session["images"]:
+        return JSONResponse({"success": False, "error": "Imagem não encontrada"}, status_code=404)
+
+    entry = session["images"][image_name]
+    etag = f'"{entry["etag"]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["png"], media_type="image/png", headers=headers)
+
 @app.get("/api/charts/{session_id}")
-async def get_charts(session_id: str):
+async def get_charts(request: Request, session_id: str, compact: bool = False):
     try:
-        if session_id not in sessions or not sessions[session_id].get("processed"):
+        session = sessions.get(session_id)
+        if session is None or not session.get("processed"):
             return JSONResponse({"success": False, "error": "Sessão não encontrada"}, status_code=404)
 
-        results = sessions[session_id]["results"]
-        filter_names = list(results.keys())
-        mse_values = [results[f]['mse'] for f in filter_names]
-        psnr_values = [results[f]['psnr'] for f in filter_names]
-
-        fig_mse = go.Figure()
-        fig_mse.add_trace(go.Bar(
-            x=filter_names, y=mse_values, name='MSE',
-            marker_color='rgb(55, 83, 109)',
-            text=[f'{v:.2f}' for v in mse_values],
-            textposition='auto',
-        ))
-        fig_mse.update_layout(title='MSE por Filtro', xaxis_title='Filtro', yaxis_title='MSE', height=400, template='plotly_white')
-
-        fig_psnr = go.Figure()
-        fig_psnr.add_trace(go.Bar(
-            x=filter_names, y=psnr_values, name='PSNR',
-            marker_color='rgb(26, 118, 255)',
-            text=[f'{v:.2f}' for v in psnr_values],
-            textposition='auto',
-        ))
-        fig_psnr.update_layout(title='PSNR por Filtro', xaxis_title='Filtro', yaxis_title='PSNR (dB)', height=400, template='plotly_white')
-
-        fig_comparison = go.Figure()
-        fig_comparison.add_trace(go.Scatter(
-            x=mse_values, y=psnr_values, mode='markers+text',
-            text=[f.replace(' ', '<br>') for f in filter_names],
-            textposition='top center',
-            marker=dict(size=12, color=psnr_values, colorscale='Viridis', showscale=True, colorbar=dict(title="PSNR (dB)")),
-        ))
-        fig_comparison.update_layout(title='MSE vs PSNR', xaxis_title='MSE', yaxis_title='PSNR (dB)', height=500, template='plotly_white')
-
-        return JSONResponse({
-            "success": True,
-            "charts": {
-                "mse": json.loads(fig_mse.to_json()),
-                "psnr": json.loads(fig_psnr.to_json()),
-                "comparison": json.loads(fig_comparison.to_json())
-            }
-        })
+        # As séries são calculadas ao fim do processamento; o ETag muda
+        # quando a sessão é processada de novo
+        series = session["charts"]
+        etag = f'"{series["etag"]}{"c" if compact else ""}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        if compact:
+            # Só os números; a demo monta os gráficos no navegador
+            return JSONResponse({
+                "success": True,
+                "series": {name: series[name] for name in ("filters", "mse", "psnr", "ssim")},
+            }, headers=headers)
+
+        # Figuras do plotly montadas (e o plotly importado) só no primeiro
+        # pedido da sessão, fora do event loop; depois saem do cache
+        body = session.get("charts_json")
+        if body is None:
+            body = await asyncio.to_thread(plotly_charts_json, series)
+            # Não guarda se a sessão foi reprocessada enquanto montava
+            if session.get("charts") is series:
+                sessions.update(session_id, charts_json=body)
+        return Response(content=body, media_type="application/json", headers=headers)
 
     except Exception as e:
         return JSONResponse({"success": False, "error": str(e)}, status_code=500)
@@ -203,9 +859,11 @@ async def export_results(session_id: str):
             data.append({
                 'Filtro': filter_name,
                 'MSE': f"{metrics['mse']:.4f}",
-                'PSNR (dB)': f"{metrics['psnr']:.4f}"
+                'PSNR (dB)': f"{metrics['psnr']:.4f}",
+                'SSIM': f"{metrics['ssim']:.4f}"
             })
 
+        import pandas as pd
         df = pd.DataFrame(data)
         csv_path = RESULTS_DIR / f"resultados_{session_id}.csv"
         df.to_csv(csv_path, index=False)
@@ -215,13 +873,147 @@ async def export_results(session_id: str):
     except Exception as e:
         return JSONResponse({"success": False, "error": str(e)}, status_code=500)
 
+@app.post("/api/jobs")
+async def create_job(
+    files: List[UploadFile] = File(...),
+    noise_type: str = Form("salt_pepper"),
+    salt_prob: float = Form(0.02),
+    pepper_prob: float = Form(0.02),
+    gaussian_sigma: float = Form(25.0),
+    filters: Optional[str] = Form(None),
+    seed: Optional[int] = Form(None)
+):
+    job_dir = None
+    try:
+        if noise_type not in NOISE_TYPES:
+            return JSONResponse({"success": False, "error": f"Tipo de ruído inválido: {noise_type}"}, status_code=400)
+        try:
+            filter_names = resolve_filters(filters)
+        except ValueError as e:
+            return JSONResponse({"success": False, "error": str(e)}, status_code=400)
+
+        job_id = uuid.uuid4().hex
+        job_dir = JOBS_DIR / job_id
+        try:
+            images = await asyncio.to_thread(save_job_files, job_dir, files)
+        except zipfile.BadZipFile:
+            return JSONResponse({"success": False, "error": "Arquivo ZIP inválido"}, status_code=400)
+        except JobTooLarge as e:
+            return JSONResponse({"success": False, "error": str(e)}, status_code=e.status_code)
+        if not images:
+            return JSONResponse({"success": False, "error": "Nenhuma imagem enviada"}, status_code=400)
+
+        # A imagem N usa seed + N - 1, como no script; sem seed, uma seed
+        # base aleatória é sorteada e guardada no job
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % (2**32))
+        params = {
+            "noise_type": noise_type,
+            "salt_prob": salt_prob,
+            "pepper_prob": pepper_prob,
+            "gaussian_sigma": gaussian_sigma,
+            "filters": filter_names,
+            "seed": seed,
+        }
+        await asyncio.to_thread(jobs.create, job_id, params, images)
+        job_dir = None
+        jobs_wakeup.set()
+
+        return JSONResponse({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "total": len(images),
+            "status_url": f"/api/jobs/{job_id}"
+        }, status_code=202)
+
+    except Exception as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    finally:
+        # Job não criado: descarta os arquivos já gravados
+        if job_dir is not None:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(jobs.get, job_id)
+    if job is None:
+        return JSONResponse({"success": False, "error": "Job não encontrado"}, status_code=404)
+
+    images = job["images"]
+    done = sum(image["status"] == "done" for image in images)
+    failed = sum(image["status"] == "failed" for image in images)
+    return JSONResponse({
+        "success": True,
+        "job_id": job_id,
+        "status": job["status"],
+        "error": job["error"],
+        "params": job["params"],
+        "created_at": datetime.fromtimestamp(job["created_at"]).isoformat(),
+        "updated_at": datetime.fromtimestamp(job["updated_at"]).isoformat(),
+        "progress": {
+            "total": len(images),
+            "done": done,
+            "failed": failed,
+            "percent": round(100 * (done + failed) / len(images), 1)
+        },
+        "images": [
+            {
+                "index": image["index"],
+                "filename": image["filename"],
+                "status": image["status"],
+                "metrics": round_metrics(image["metrics"]) if image["metrics"] else None,
+                "error": image["error"]
+            }
+            for image in images
+        ],
+        "aggregate": round_metrics(aggregate_metrics(images))
+    })
+
+@app.get("/api/jobs/{job_id}/export")
+async def export_job(job_id: str):
+    try:
+        job = await asyncio.to_thread(jobs.get, job_id)
+        if job is None:
+            return JSONResponse({"success": False, "error": "Job não encontrado"}, status_code=404)
+        aggregate = aggregate_metrics(job["images"])
+        if not aggregate:
+            return JSONResponse({"success": False, "error": "Nenhuma imagem concluída"}, status_code=404)
+
+        # Mesmo formato do metricas_media.csv do script
+        data = []
+        for filter_name, means in aggregate.items():
+            data.append({
+                'Filtro': filter_name,
+                'MSE Médio': f"{means['mse']:.4f}",
+                'PSNR Médio (dB)': f"{means['psnr']:.4f}",
+                'SSIM Médio': f"{means['ssim']:.4f}"
+            })
+
+        import pandas as pd
+        csv_path = RESULTS_DIR / f"metricas_media_{job_id}.csv"
+        pd.DataFrame(data).to_csv(csv_path, index=False)
+
+        return FileResponse(csv_path, media_type='text/csv', filename="metricas_media.csv")
+
+    except Exception as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
 @app.get("/api/info")
 async def get_info():
     return JSONResponse({"success": True, "info": STUDENT_INFO})
 
+@app.get("/metrics")
+async def metrics():
+    if not METRICS_ENABLED:
+        return JSONResponse({"success": False, "error": "Métricas desativadas"}, status_code=404)
+    payload, content_type = monitoring.render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "timestamp": datetime.now().isoformat()}
+    return {"status": "ok", "timestamp": datetime.now().isoformat(), "sessions": sessions.stats(), "cache": cache_stats,
+            "jobs": await asyncio.to_thread(jobs.stats), "admission": admission.stats()}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,75 @@
+from typing import Dict
+
+import cv2
+import numpy as np
+
+
+# Pixels por bloco de linhas; limita a memória temporária (float32/int32)
+CHUNK_PIXELS = 1 << 20
+# Janela uniforme do SSIM (7x7, como o padrão do skimage)
+SSIM_WINDOW = 7
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+def psnr_from_mse(mse: float, max_pixel: float = 255.0) -> float:
+    if mse == 0:
+        return float('inf')
+    return float(20 * np.log10(max_pixel / np.sqrt(mse)))
+
+
+def _box(values: np.ndarray) -> np.ndarray:
+    return cv2.boxFilter(values, cv2.CV_32F, (SSIM_WINDOW, SSIM_WINDOW), borderType=cv2.BORDER_REFLECT_101)
+
+
+def compute_metrics(original: np.ndarray, images: Dict[str, np.ndarray], ssim: bool = True) -> Dict[str, Dict[str, float]]:
+    """
+    Calcula MSE, PSNR e (opcionalmente) SSIM de todas as imagens em relação
+    à original, percorrendo a original uma única vez em blocos de linhas.
+
+    O MSE usa acumulação inteira exata; o SSIM usa médias locais em float32
+    (box filter), com as estatísticas da original compartilhadas entre
+    todas as imagens. Os blocos levam um halo de linhas, então o resultado
+    é o mesmo do cálculo sobre a imagem inteira.
+    """
+    height = original.shape[0]
+    total = original.size
+    chunk_rows = max(1, CHUNK_PIXELS // max(1, total // max(1, height)))
+    halo = SSIM_WINDOW // 2
+
+    sse = {name: 0 for name in images}
+    ssim_sum = {name: 0.0 for name in images}
+
+    for y0 in range(0, height, chunk_rows):
+        y1 = min(y0 + chunk_rows, height)
+        reference = original[y0:y1].astype(np.int16)
+        for name, image in images.items():
+            diff = image[y0:y1].astype(np.int16)
+            diff -= reference
+            sse[name] += int(np.square(diff, dtype=np.int32).sum(dtype=np.int64))
+
+        if not ssim:
+            continue
+
+        top = max(0, y0 - halo)
+        bottom = min(height, y1 + halo)
+        inner = slice(y0 - top, y1 - top)
+        x = original[top:bottom].astype(np.float32)
+        mu_x = _box(x)
+        var_x = _box(x * x) - mu_x * mu_x
+        for name, image in images.items():
+            y = image[top:bottom].astype(np.float32)
+            mu_y = _box(y)
+            var_y = _box(y * y) - mu_y * mu_y
+            cov = _box(x * y) - mu_x * mu_y
+            numerator = (2 * mu_x * mu_y + SSIM_C1) * (2 * cov + SSIM_C2)
+            denominator = (mu_x * mu_x + mu_y * mu_y + SSIM_C1) * (var_x + var_y + SSIM_C2)
+            ssim_sum[name] += float((numerator / denominator)[inner].sum(dtype=np.float64))
+
+    metrics = {}
+    for name in images:
+        mse = sse[name] / total
+        metrics[name] = {'mse': mse, 'psnr': psnr_from_mse(mse)}
+        if ssim:
+            metrics[name]['ssim'] = ssim_sum[name] / total
+    return metrics
@@ -0,0 +1,72 @@
+import os
+from typing import Dict, List, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+from timing import Stage
+
+# Com vários workers do uvicorn, cada processo grava as métricas em arquivos
+# em PROMETHEUS_MULTIPROC_DIR (definida antes de iniciar o servidor) e o
+# /metrics de qualquer worker agrega os arquivos de todos
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    "filtros_http_request_duration_seconds", "Latência das requisições HTTP por rota",
+    ["method", "route", "status"], buckets=REQUEST_BUCKETS,
+)
+FILTER_LATENCY = Histogram(
+    "filtros_filter_duration_seconds", "Tempo de execução de cada filtro", ["filter"], buckets=STAGE_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "filtros_stage_duration_seconds", "Tempo das demais etapas (ruído, métricas, PNG, decodificação)",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+UPLOADS = Counter("filtros_uploads_total", "Imagens enviadas")
+IMAGES_PROCESSED = Counter("filtros_images_processed_total", "Imagens processadas (todos os filtros)", ["mode"])
+ERRORS = Counter("filtros_errors_total", "Erros por rota e motivo", ["route", "reason"])
+SESSIONS = Gauge("filtros_sessions", "Sessões em memória", multiprocess_mode="livesum")
+SESSION_BYTES = Gauge("filtros_session_resident_bytes", "Bytes das imagens guardadas nas sessões",
+                      multiprocess_mode="livesum")
+ADMISSION_QUEUE = Gauge("filtros_admission_queue_depth", "Processamentos esperando na fila de admissão",
+                        multiprocess_mode="livesum")
+ADMISSION_IN_USE = Gauge("filtros_admission_cost_in_use", "Custo estimado dos processamentos em andamento",
+                         multiprocess_mode="livesum")
+ADMISSION_REJECTED = Counter("filtros_admission_rejected_total", "Processamentos recusados com 429", ["reason"])
+
+
+def observe_stages(stages: List[Stage]):
+    for name, ms, _ in stages:
+        if name.startswith("filter:"):
+            FILTER_LATENCY.labels(name[len("filter:"):]).observe(ms / 1000)
+        else:
+            STAGE_LATENCY.labels(name).observe(ms / 1000)
+
+
+def update_session_gauges(stats: Dict):
+    SESSIONS.set(stats["sessions"])
+    SESSION_BYTES.set(stats["resident_bytes"])
+
+
+def update_admission_gauges(stats: Dict):
+    ADMISSION_QUEUE.set(stats["queued"])
+    ADMISSION_IN_USE.set(stats["in_use"])
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    # Remove os gauges "live" deste processo ao encerrar o worker
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
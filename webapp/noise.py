@@ -0,0 +1,54 @@
+from typing import Optional, Union
+
+import numpy as np
+
+
+# Pixels processados por vez; fixo para que a mesma seed gere sempre o
+# mesmo ruído. O pico de memória fica perto do tamanho da imagem de saída.
+CHUNK_PIXELS = 1 << 20
+
+Seed = Optional[Union[int, np.random.Generator]]
+
+
+def add_salt_pepper_noise(image: np.ndarray, salt_prob: float = 0.02, pepper_prob: float = 0.02,
+                          seed: Seed = None, out: Optional[np.ndarray] = None) -> np.ndarray:
+    # Um único sorteio por pixel: u < salt_prob vira sal (255) e
+    # salt_prob <= u < salt_prob + pepper_prob vira pimenta (0). Com out
+    # (por exemplo um np.memmap), o resultado é escrito nele, bloco a bloco
+    rng = np.random.default_rng(seed)
+    source = np.ascontiguousarray(image).reshape(-1)
+    noisy = np.empty(image.shape, dtype=image.dtype) if out is None else out
+    flat = noisy.reshape(-1)
+    draws = np.empty(min(CHUNK_PIXELS, flat.size), dtype=np.float32)
+
+    for start in range(0, flat.size, CHUNK_PIXELS):
+        end = min(start + CHUNK_PIXELS, flat.size)
+        chunk = flat[start:end]
+        chunk[:] = source[start:end]
+        u = draws[:chunk.size]
+        rng.random(dtype=np.float32, out=u)
+        chunk[u < salt_prob] = 255
+        chunk[(u >= salt_prob) & (u < salt_prob + pepper_prob)] = 0
+
+    return noisy
+
+
+def add_gaussian_noise(image: np.ndarray, mean: float = 0, sigma: float = 25, seed: Seed = None,
+                       out: Optional[np.ndarray] = None) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    source = np.ascontiguousarray(image).reshape(-1)
+    noisy = np.empty(image.shape, dtype=np.uint8) if out is None else out
+    flat = noisy.reshape(-1)
+    buffer = np.empty(min(CHUNK_PIXELS, flat.size), dtype=np.float32)
+
+    for start in range(0, flat.size, CHUNK_PIXELS):
+        end = min(start + CHUNK_PIXELS, flat.size)
+        values = buffer[:end - start]
+        rng.standard_normal(dtype=np.float32, out=values)
+        values *= sigma
+        values += mean
+        values += source[start:end]
+        np.clip(values, 0, 255, out=values)
+        flat[start:end] = values
+
+    return noisy
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from session_store import estimate_nbytes
+
+
+# Incrementado quando o conteúdo das entradas muda, invalidando o disco
+CACHE_VERSION = 2
+
+
+def make_cache_key(image: np.ndarray, noise_type: str, noise_params: Dict, seed: Optional[int]) -> Optional[str]:
+    # Sem seed o ruído é diferente a cada chamada e não há o que reaproveitar
+    if seed is None:
+        return None
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.shape}|{image.dtype}|".encode())
+    digest.update(np.ascontiguousarray(image).data)
+    params = json.dumps(noise_params, sort_keys=True)
+    return f"v{CACHE_VERSION}|{digest.hexdigest()}|{noise_type}|{params}|{seed}"
+
+
+class ResultCache:
+    """
+    Cache de resultados (imagem ruidosa, imagens filtradas e métricas)
+    endereçado pelo conteúdo: a chave é o hash dos pixels da imagem original
+    mais o tipo, os parâmetros e a seed do ruído.
+
+    Mantém uma camada em memória limitada por bytes (LRU) e, opcionalmente,
+    uma camada em disco (.npz) também limitada por tamanho, que pode ser
+    compartilhada entre processos.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resident_bytes = 0
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store(key, entry)
+            return entry
+
+    def put(self, key: str, entry: Dict):
+        with self._lock:
+            self._store(key, entry)
+        self._save(key, entry)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+            }
+
+    def _store(self, key: str, entry: Dict):
+        if key in self._entries:
+            self.resident_bytes -= self._sizes.pop(key)
+            del self._entries[key]
+        size = estimate_nbytes(entry)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._sizes[key] = size
+        self.resident_bytes += size
+        while self.resident_bytes > self.max_bytes:
+            oldest, _ = self._entries.popitem(last=False)
+            self.resident_bytes -= self._sizes.pop(oldest)
+            self.evictions += 1
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.npz"
+
+    def _load(self, key: str) -> Optional[Dict]:
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {name: data[name] if data[name].ndim else data[name].item() for name in data.files}
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, key: str, entry: Dict):
+        if self.disk_dir is None or self.disk_max_bytes <= 0:
+            return
+        # Escrita atômica: outros processos nunca leem um arquivo pela metade
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **{name: np.asarray(value) for name, value in entry.items()})
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        files = []
+        for path in self.disk_dir.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
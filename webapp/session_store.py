@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+def estimate_nbytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(v) for v in value)
+    return 0
+
+
+class SessionStore:
+    """
+    Armazena as sessões da aplicação com limite de memória (soma de nbytes
+    dos arrays), expiração por inatividade (TTL) e descarte LRU.
+
+    Pode ser usado como um dict: `session_id in store`, `store[session_id]`
+    e `store[session_id] = {...}`. Alterações nos campos de uma sessão devem
+    passar por `update` para que o tamanho seja recalculado.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+        self.resident_bytes = 0
+        # Ordem de acesso: o primeiro item é o menos usado recentemente
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id: str) -> Dict:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: Dict):
+        self.set(session_id, session)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                self._last_access[session_id] = now
+            return session
+
+    def set(self, session_id: str, session: Dict):
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove(session_id)
+            self._sessions[session_id] = session
+            self._last_access[session_id] = time.monotonic()
+            self._account(session_id)
+
+    def update(self, session_id: str, **fields) -> bool:
+        with self._lock:
+            session = self.get(session_id)
+            if session is None:
+                return False
+            session.update(fields)
+            self._account(session_id)
+            return True
+
+    def pop(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            if session_id not in self._sessions:
+                return None
+            return self._remove(session_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "sessions": len(self._sessions),
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _account(self, session_id: str):
+        size = estimate_nbytes(self._sessions[session_id])
+        self.resident_bytes += size - self._sizes.get(session_id, 0)
+        self._sizes[session_id] = size
+        self._evict()
+
+    def _remove(self, session_id: str) -> Dict:
+        session = self._sessions.pop(session_id)
+        self.resident_bytes -= self._sizes.pop(session_id)
+        del self._last_access[session_id]
+        return session
+
+    def _expire(self, now: float):
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if now - self._last_access[oldest] <= self.ttl:
+                break
+            self._remove(oldest)
+            self.expirations += 1
+
+    def _evict(self):
+        # A sessão recém-alterada é a última da fila e nunca é descartada,
+        # mesmo que sozinha ultrapasse o limite
+        while self.resident_bytes > self.max_bytes and len(self._sessions) > 1:
+            self._remove(next(iter(self._sessions)))
+            self.evictions += 1
@@ -74,6 +74,48 @@ def create_directories():
     print()
 
 
+def profile_imports(modules, cwd=None):
+    """Resume `python -X importtime`: tempo total e por pacote de cada módulo"""
+    code = "; ".join(f"import {module}" for module in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, cwd=cwd)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    report = []
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1000
+        # Sem recuo: import feito pelo próprio interpretador ou pelo código acima
+        if not name.startswith("  "):
+            if name.strip() in modules:
+                report.append((name.strip(), int(cumulative_us) / 1000, packages))
+            packages = {}
+    return report
+
+
+def print_startup_profile(top=8):
+    """Imprime o tempo de importação da aplicação e das dependências sob demanda"""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    report = profile_imports(("main", "pandas", "plotly.graph_objects"), cwd=app_dir)
+
+    print("Tempo de importação (python -X importtime, resumido):")
+    print()
+    name, total_ms, packages = report[0]
+    print(f"  {name}: {total_ms:.1f} ms")
+    for package, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"    {package:20s} {ms:8.1f} ms")
+    print()
+    print("  Sob demanda (importados apenas no primeiro uso):")
+    for name, total_ms, _ in report[1:]:
+        print(f"    {name:20s} {total_ms:8.1f} ms")
+    print()
+
+
 def print_access_info(port=8000):
     """Imprime informações de acesso"""
     ip = get_local_ip()
@@ -121,6 +163,10 @@ def start_server(port=8000):
 def main():
     """Função principal"""
     print_header()
+    if "--profile-startup" in sys.argv:
+        print_startup_profile()
+        return
+
     check_python()
     check_dependencies()
     create_directories()
@@ -1,6 +1,10 @@
 // Demo Page JavaScript
 
 let currentSessionId = null;
+// Stream em andamento; abortado quando o usuário processa de novo
+let currentStream = null;
+// Se o stream atual já mostrou algum nível reduzido
+let levelShown = false;
 
 // Elements
 const dropZone = document.getElementById('dropZone');
@@ -9,6 +13,14 @@ const uploadedImageDiv = document.getElementById('uploadedImage');
 const step2 = document.getElementById('step2');
 const step3 = document.getElementById('step3');
 const processBtn = document.getElementById('processBtn');
+const previewMode = document.getElementById('previewMode');
+const fullResolutionOption = document.getElementById('fullResolutionOption');
+const fullResolution = document.getElementById('fullResolution');
+const filterSpec = document.getElementById('filterSpec');
+
+// Arquivos acima deste tamanho são decodificados reduzidos na pré-visualização
+const PREVIEW_MIN_BYTES = 1024 * 1024;
+const PREVIEW_REDUCTION = 4;
 
 // Noise controls
 const noiseTypeRadios = document.getElementsByName('noiseType');
@@ -81,6 +93,9 @@ async function handleFile(file) {
 
     const formData = new FormData();
     formData.append('file', file);
+    if (previewMode.checked && file.size > PREVIEW_MIN_BYTES) {
+        formData.append('preview', PREVIEW_REDUCTION);
+    }
 
     try {
         const response = await fetch('/api/upload', {
@@ -106,11 +121,18 @@ async function handleFile(file) {
 function displayUploadedImage(data) {
     document.getElementById('originalPreview').src = data.image;
     document.getElementById('fileName').textContent = data.filename;
-    document.getElementById('imageDims').textContent = `${data.shape[1]}×${data.shape[0]} pixels`;
+    showDimensions(data.shape, data.reduction);
     uploadedImageDiv.classList.remove('hidden');
     uploadedImageDiv.classList.add('fade-in');
 }
 
+function showDimensions(shape, reduction) {
+    const note = reduction > 1 ? ` (pré-visualização, 1/${reduction} da resolução)` : '';
+    document.getElementById('imageDims').textContent = `${shape[1]}×${shape[0]} pixels${note}`;
+    fullResolution.checked = false;
+    fullResolutionOption.classList.toggle('hidden', reduction <= 1);
+}
+
 function showStep2() {
     step2.classList.remove('hidden');
     step2.classList.add('fade-in');
@@ -136,6 +158,14 @@ processBtn.addEventListener('click', async () => {
     } else {
         formData.append('gaussian_sigma', gaussianSigma.value);
     }
+    if (fullResolution.checked) {
+        formData.append('full_resolution', 'true');
+    }
+    if (filterSpec.value.trim()) {
+        formData.append('filters', filterSpec.value.trim());
+    }
+    // Níveis reduzidos primeiro, refinados até a resolução total
+    formData.append('progressive', 'true');
 
     // Show loading
     step3.classList.remove('hidden');
@@ -143,77 +173,174 @@ processBtn.addEventListener('click', async () => {
     document.getElementById('results').classList.add('hidden');
     step3.scrollIntoView({ behavior: 'smooth', block: 'start' });
 
-    try {
-        const response = await fetch('/api/process', {
-            method: 'POST',
-            body: formData
-        });
-
-        const data = await response.json();
+    if (currentStream) {
+        currentStream.abort();
+    }
+    const controller = new AbortController();
+    currentStream = controller;
+    levelShown = false;
 
-        if (data.success) {
-            displayResults(data);
-            await loadCharts();
-        } else {
-            alert('Erro ao processar: ' + data.error);
-        }
+    try {
+        await processStream(formData, controller.signal);
     } catch (error) {
+        if (error.name === 'AbortError') return;
         console.error('Erro:', error);
         alert('Erro ao processar imagem');
     } finally {
-        document.getElementById('loading').classList.add('hidden');
+        if (currentStream === controller) {
+            currentStream = null;
+            document.getElementById('loading').classList.add('hidden');
+        }
     }
 });
 
-function displayResults(data) {
-    // Original vs Noisy
-    document.getElementById('resultOriginal').src = document.getElementById('originalPreview').src;
-    document.getElementById('resultNoisy').src = data.noisy_image;
-    document.getElementById('noiseTypeLabel').textContent =
-        data.noise_type === 'salt_pepper' ? 'Sal e Pimenta' : 'Gaussiano';
+// Reads the Server-Sent Events from /api/process/stream, showing each filter as soon as it finishes
+async function processStream(formData, signal) {
+    const response = await fetch('/api/process/stream', {
+        method: 'POST',
+        body: formData,
+        signal
+    });
+
+    if (!response.ok) {
+        const data = await response.json();
+        alert('Erro ao processar: ' + data.error);
+        return;
+    }
 
-    // Best filter
-    document.getElementById('bestFilterName').textContent = data.stats.best_filter;
-    document.getElementById('bestMSE').textContent = data.stats.best_mse.toFixed(4);
-    document.getElementById('bestPSNR').textContent = data.stats.best_psnr.toFixed(4);
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
 
-    // Filters grid
-    const filtersGrid = document.getElementById('filtersGrid');
-    filtersGrid.innerHTML = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
 
-    for (const [filterName, filterData] of Object.entries(data.filters)) {
-        const filterCard = createFilterCard(filterName, filterData);
-        filtersGrid.appendChild(filterCard);
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            await handleStreamEvent(rawEvent);
+        }
     }
+}
 
-    // Metrics table
-    const tableBody = document.getElementById('metricsTableBody');
-    tableBody.innerHTML = '';
+async function handleStreamEvent(rawEvent) {
+    let event = 'message';
+    let data = '';
+    for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+    }
+    const payload = JSON.parse(data);
+
+    if (event === 'level') {
+        displayLevel(payload);
+    } else if (event === 'noisy') {
+        displayNoisy(payload);
+    } else if (event === 'filter') {
+        displayFilter(payload);
+    } else if (event === 'done') {
+        displayStats(payload.stats);
+        await loadCharts();
+    } else if (event === 'error') {
+        alert('Erro ao processar: ' + payload.error);
+    }
+}
 
+// Nível reduzido do modo progressivo: todos os filtros de uma vez, com
+// métricas aproximadas, substituídos depois pelos da resolução total
+function displayLevel(data) {
+    if (!levelShown) {
+        resetResults(data.noise_type);
+        levelShown = true;
+    }
+    document.getElementById('resultOriginal').src = document.getElementById('originalPreview').src;
+    document.getElementById('resultNoisy').src = data.noisy_image;
+    const label = `aprox. 1/${data.downscale}`;
     for (const [filterName, filterData] of Object.entries(data.filters)) {
-        const row = createTableRow(filterName, filterData);
-        tableBody.appendChild(row);
+        showFilter(filterName, filterData, label);
+    }
+}
+
+function resetResults(noiseType) {
+    if (noiseType) {
+        document.getElementById('noiseTypeLabel').textContent =
+            noiseType === 'salt_pepper' ? 'Sal e Pimenta' : 'Gaussiano';
     }
 
+    // Best filter is only known at the end
+    document.getElementById('bestFilterName').textContent = '-';
+    document.getElementById('bestMSE').textContent = '-';
+    document.getElementById('bestPSNR').textContent = '-';
+
+    document.getElementById('filtersGrid').innerHTML = '';
+    document.getElementById('metricsTableBody').innerHTML = '';
+
     // Export button
     document.getElementById('exportCSV').onclick = () => {
         window.location.href = `/api/export/${currentSessionId}`;
     };
 
     // Show results
+    document.getElementById('loading').classList.add('hidden');
     document.getElementById('results').classList.remove('hidden');
     document.getElementById('results').classList.add('fade-in');
 }
 
-function createFilterCard(filterName, filterData) {
+function displayNoisy(data) {
+    // Original vs Noisy
+    document.getElementById('resultOriginal').src = data.original_image;
+    if (data.original_image !== document.getElementById('originalPreview').getAttribute('src')) {
+        // Passou da pré-visualização para a resolução total
+        document.getElementById('originalPreview').src = data.original_image;
+        showDimensions(data.shape, data.reduction);
+    }
+    document.getElementById('resultNoisy').src = data.image;
+    // Sem níveis reduzidos antes (imagem pequena), os resultados começam aqui
+    if (!levelShown) {
+        resetResults(data.noise_type);
+    }
+}
+
+function displayFilter(data) {
+    showFilter(data.name, data, null);
+}
+
+// Cria ou substitui, no mesmo lugar, o card e a linha da tabela do filtro
+function showFilter(filterName, filterData, label) {
+    const key = encodeURIComponent(filterName);
+    const card = createFilterCard(filterName, filterData, label);
+    const row = createTableRow(filterName, filterData);
+    card.dataset.filter = key;
+    row.dataset.filter = key;
+
+    const oldCard = document.querySelector(`#filtersGrid [data-filter="${key}"]`);
+    const oldRow = document.querySelector(`#metricsTableBody [data-filter="${key}"]`);
+    if (oldCard) oldCard.replaceWith(card);
+    else document.getElementById('filtersGrid').appendChild(card);
+    if (oldRow) oldRow.replaceWith(row);
+    else document.getElementById('metricsTableBody').appendChild(row);
+}
+
+function displayStats(stats) {
+    document.getElementById('bestFilterName').textContent = stats.best_filter;
+    document.getElementById('bestMSE').textContent = stats.best_mse.toFixed(4);
+    document.getElementById('bestPSNR').textContent = stats.best_psnr.toFixed(4);
+}
+
+function createFilterCard(filterName, filterData, label) {
     const card = document.createElement('div');
     card.className = 'bg-gray-50 rounded-lg p-4 hover:shadow-md transition';
+    const badge = label ? ` <span class="text-xs font-normal text-gray-500">(${label})</span>` : '';
     card.innerHTML = `
-        <h3 class="font-semibold mb-2">${filterName}</h3>
+        <h3 class="font-semibold mb-2">${filterName}${badge}</h3>
         <img src="${filterData.image}" class="rounded mb-2 w-full" alt="${filterName}">
         <div class="text-sm text-gray-600">
             <p>MSE: <span class="font-semibold">${filterData.mse}</span></p>
             <p>PSNR: <span class="font-semibold">${filterData.psnr} dB</span></p>
+            <p>SSIM: <span class="font-semibold">${filterData.ssim}</span></p>
         </div>
     `;
     return card;
@@ -235,15 +362,51 @@ function createTableRow(filterName, filterData) {
     return row;
 }
 
+// Layout comum aos gráficos, no lugar do template plotly_white do servidor
+const CHART_LAYOUT = {
+    plot_bgcolor: 'white',
+    paper_bgcolor: 'white',
+    xaxis: { gridcolor: '#EBF0F8', zerolinecolor: '#EBF0F8' },
+    yaxis: { gridcolor: '#EBF0F8', zerolinecolor: '#EBF0F8' },
+};
+
+function chartLayout(title, xTitle, yTitle, height) {
+    return {
+        ...CHART_LAYOUT,
+        title: { text: title },
+        height: height,
+        xaxis: { ...CHART_LAYOUT.xaxis, title: { text: xTitle } },
+        yaxis: { ...CHART_LAYOUT.yaxis, title: { text: yTitle } },
+    };
+}
+
 async function loadCharts() {
     try {
-        const response = await fetch(`/api/charts/${currentSessionId}`);
+        // Modo compacto: o servidor manda só as séries e os gráficos são
+        // montados aqui
+        const response = await fetch(`/api/charts/${currentSessionId}?compact=1`);
         const data = await response.json();
 
         if (data.success) {
-            Plotly.newPlot('chartMSE', data.charts.mse.data, data.charts.mse.layout);
-            Plotly.newPlot('chartPSNR', data.charts.psnr.data, data.charts.psnr.layout);
-            Plotly.newPlot('chartComparison', data.charts.comparison.data, data.charts.comparison.layout);
+            const { filters, mse, psnr } = data.series;
+            Plotly.newPlot('chartMSE', [{
+                type: 'bar', x: filters, y: mse, name: 'MSE',
+                marker: { color: 'rgb(55, 83, 109)' },
+                text: mse.map(v => v.toFixed(2)), textposition: 'auto',
+            }], chartLayout('MSE por Filtro', 'Filtro', 'MSE', 400));
+            Plotly.newPlot('chartPSNR', [{
+                type: 'bar', x: filters, y: psnr, name: 'PSNR',
+                marker: { color: 'rgb(26, 118, 255)' },
+                text: psnr.map(v => v.toFixed(2)), textposition: 'auto',
+            }], chartLayout('PSNR por Filtro', 'Filtro', 'PSNR (dB)', 400));
+            Plotly.newPlot('chartComparison', [{
+                type: 'scatter', x: mse, y: psnr, mode: 'markers+text',
+                text: filters.map(f => f.replace(/ /g, '<br>')), textposition: 'top center',
+                marker: {
+                    size: 12, color: psnr, colorscale: 'Viridis', showscale: true,
+                    colorbar: { title: { text: 'PSNR (dB)' } },
+                },
+            }], chartLayout('MSE vs PSNR', 'MSE', 'PSNR (dB)', 500));
         }
     } catch (error) {
         console.error('Erro ao carregar gráficos:', error);
@@ -0,0 +1,98 @@
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+# Modo de np.pad equivalente à borda que cada filtro usa na imagem inteira:
+# cv2.blur e cv2.GaussianBlur usam BORDER_REFLECT_101 ('reflect'),
+# cv2.medianBlur e o filtro de moda replicam a borda ('edge')
+FILTER_BORDERS: Dict[Callable, str] = {}
+
+
+def register_filter(filter_func: Callable, border: str) -> Callable:
+    FILTER_BORDERS[filter_func] = border
+    return filter_func
+
+
+def _filter_tile(filter_func: Callable, tile: np.ndarray, kernel_size: int, halo: int, *args) -> np.ndarray:
+    filtered = filter_func(tile, kernel_size, *args)
+    return filtered[halo:filtered.shape[0] - halo, halo:filtered.shape[1] - halo]
+
+
+class TileExecutor:
+    """
+    Executa filtros espaciais em blocos com sobreposição (halo) de
+    kernel_size // 2 pixels, em paralelo num pool de threads ou processos.
+
+    A imagem é expandida uma única vez com a mesma borda que o filtro usaria,
+    então cada bloco vê exatamente a vizinhança que teria na imagem inteira e
+    o resultado costurado é idêntico ao processamento sem blocos. Vários
+    filtros com a mesma borda podem compartilhar uma expansão (`padded`).
+    """
+
+    def __init__(self, workers: Optional[int] = None, tile_rows: int = 256,
+                 tile_cols: Optional[int] = None, use_processes: bool = False):
+        self.workers = workers or os.cpu_count() or 1
+        self.tile_rows = tile_rows
+        self.tile_cols = tile_cols
+        self.use_processes = use_processes
+        self._pool: Optional[Executor] = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            pool_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._pool = pool_cls(max_workers=self.workers)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def splits(self, image: np.ndarray) -> bool:
+        height, width = image.shape[:2]
+        return self.workers > 1 and (height > (self.tile_rows or height) or width > (self.tile_cols or width))
+
+    def run(self, filter_func: Callable, image: np.ndarray, kernel_size: int, *args,
+            out: Optional[np.ndarray] = None, padded: Optional[Tuple[np.ndarray, int]] = None) -> np.ndarray:
+        # args vão para o filtro depois do kernel; com out, o resultado é
+        # escrito nesse array; padded é (imagem expandida, halo) com a mesma
+        # borda do filtro e halo maior ou igual ao dele
+        height, width = image.shape[:2]
+        tile_rows = self.tile_rows or height
+        tile_cols = self.tile_cols or width
+        if not self.splits(image):
+            return filter_func(image, kernel_size, *args, out=out)
+
+        if filter_func not in FILTER_BORDERS:
+            raise ValueError(f"Filtro não registrado para execução em blocos: {filter_func.__name__}")
+
+        halo = kernel_size // 2
+        if padded is not None:
+            padded, shared_halo = padded
+            offset = shared_halo - halo
+            padded = padded[offset:padded.shape[0] - offset, offset:padded.shape[1] - offset]
+        else:
+            padded = np.pad(image, halo, mode=FILTER_BORDERS[filter_func])
+        output = out if out is not None else np.empty_like(image)
+
+        pool = self._get_pool()
+        futures = {}
+        for y in range(0, height, tile_rows):
+            for x in range(0, width, tile_cols):
+                y_end = min(y + tile_rows, height)
+                x_end = min(x + tile_cols, width)
+                tile = padded[y:y_end + 2 * halo, x:x_end + 2 * halo]
+                futures[(y, y_end, x, x_end)] = pool.submit(_filter_tile, filter_func, tile, kernel_size, halo, *args)
+
+        for (y, y_end, x, x_end), future in futures.items():
+            output[y:y_end, x:x_end] = future.result()
+        return output
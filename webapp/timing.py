@@ -0,0 +1,86 @@
+import re
+import time
+import unicodedata
+from typing import Dict, List, Tuple
+
+# (etapa, duração em ms, bytes produzidos)
+Stage = Tuple[str, float, int]
+
+
+class _StageContext:
+    __slots__ = ("stages", "name", "nbytes", "start")
+
+    def __init__(self, stages: List[Stage], name: str):
+        self.stages = stages
+        self.name = name
+        self.nbytes = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stages.append((self.name, (time.perf_counter() - self.start) * 1000, self.nbytes))
+        return False
+
+
+class StageTimer:
+    """
+    Registra a duração e os bytes produzidos (atribuídos a `nbytes` dentro
+    do bloco) de cada etapa do processamento:
+
+        with timer.stage("noise") as stage:
+            noisy = ...
+            stage.nbytes = noisy.nbytes
+    """
+
+    def __init__(self):
+        self.stages: List[Stage] = []
+
+    def stage(self, name: str) -> _StageContext:
+        return _StageContext(self.stages, name)
+
+
+class _NullStageContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def nbytes(self) -> int:
+        return 0
+
+    @nbytes.setter
+    def nbytes(self, value: int):
+        pass
+
+
+class NullTimer:
+    """Timer desativado: `stage` devolve sempre o mesmo contexto vazio."""
+
+    stages: Tuple[Stage, ...] = ()
+    _context = _NullStageContext()
+
+    def stage(self, name: str) -> _NullStageContext:
+        return self._context
+
+
+NO_TIMER = NullTimer()
+
+
+def _metric_name(stage: str) -> str:
+    # Server-Timing só aceita tokens ASCII: "filter:Média 3x3" -> "filter-media-3x3"
+    ascii_name = unicodedata.normalize("NFKD", stage).encode("ascii", "ignore").decode()
+    return re.sub(r"[^A-Za-z0-9]+", "-", ascii_name).strip("-").lower()
+
+
+def timings_json(stages: List[Stage]) -> List[Dict]:
+    return [{"stage": name, "ms": round(ms, 3), "bytes": nbytes} for name, ms, nbytes in stages]
+
+
+def server_timing_header(stages: List[Stage]) -> str:
+    return ", ".join(f"{_metric_name(name)};dur={ms:.3f}" for name, ms, _ in stages)
@@ -0,0 +1,145 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from image_processor import ImageProcessor
+from result_cache import ResultCache
+from timing import NO_TIMER, StageTimer
+
+
+_processor: Optional[ImageProcessor] = None
+_init_lock = threading.Lock()
+
+
+def init_worker(filter_workers: int = 1, cache_max_bytes: int = 0, cache_dir: Optional[str] = None,
+                cache_disk_max_bytes: int = 0):
+    # Num pool de threads o inicializador roda uma vez por thread; o
+    # processador (e o cache em memória) é compartilhado por todas elas
+    global _processor
+    with _init_lock:
+        if _processor is not None:
+            return
+        cache = None
+        if cache_max_bytes > 0 or cache_dir:
+            cache = ResultCache(cache_max_bytes, disk_dir=cache_dir, disk_max_bytes=cache_disk_max_bytes)
+        _processor = ImageProcessor(workers=filter_workers, cache=cache)
+
+
+def check_deadline(deadline: Optional[float]):
+    # O prazo é um instante absoluto (time.time), válido tanto em threads
+    # quanto em processos; o job é abortado no próximo ponto de verificação
+    if deadline is not None and time.time() > deadline:
+        raise TimeoutError("Tempo limite de processamento excedido")
+
+
+def run_noise_job(original: np.ndarray, noise_type: str, salt_prob: float, pepper_prob: float,
+                  gaussian_sigma: float, seed: Optional[int] = None, deadline: Optional[float] = None,
+                  timer=NO_TIMER) -> Tuple[np.ndarray, bytes, Optional[str]]:
+    processor = _processor or ImageProcessor()
+    check_deadline(deadline)
+
+    cache_key = processor.noise_cache_key(original, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed)
+    noisy = processor.add_noise(original, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed, cache_key,
+                                timer=timer)
+    with timer.stage("png:noisy") as stage:
+        noisy_png = processor.encode_png(noisy)
+        stage.nbytes = len(noisy_png)
+    return noisy, noisy_png, cache_key
+
+
+def run_filter_job(original: np.ndarray, noisy: np.ndarray, filter_name: str, cache_key: Optional[str] = None,
+                   deadline: Optional[float] = None, timings: bool = False) -> Tuple[str, Dict, bytes, list]:
+    processor = _processor or ImageProcessor()
+    timer = StageTimer() if timings else NO_TIMER
+    check_deadline(deadline)
+
+    # O array filtrado fica no worker: volta só o PNG e as métricas
+    result = processor.apply_filter(filter_name, original, noisy, cache_key=cache_key, timer=timer)
+    with timer.stage("png:filters") as stage:
+        png = processor.encode_png(result.pop('image'))
+        stage.nbytes = len(png)
+    return filter_name, result, png, list(timer.stages)
+
+
+def run_processing_job(original: np.ndarray, noise_type: str, salt_prob: float, pepper_prob: float,
+                       gaussian_sigma: float, seed: Optional[int] = None, deadline: Optional[float] = None,
+                       timings: bool = False, filter_names: Optional[List[str]] = None) -> Dict:
+    processor = _processor or ImageProcessor()
+    timer = StageTimer() if timings else NO_TIMER
+    noisy, noisy_png, cache_key = run_noise_job(
+        original, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed, deadline, timer
+    )
+
+    results = processor.process_image(
+        original, noisy, progress_callback=lambda *_: check_deadline(deadline), cache_key=cache_key, timer=timer,
+        filter_names=filter_names
+    )
+    stats = processor.get_summary_stats(results)
+
+    # Os arrays (ruidosa e filtradas) ficam no worker: voltam só os PNGs e
+    # as métricas, que é o que a sessão guarda
+    pngs = {"noisy": noisy_png}
+    with timer.stage("png:filters") as stage:
+        for filter_name, data in results.items():
+            check_deadline(deadline)
+            pngs[filter_name] = processor.encode_png(data.pop('image'))
+            stage.nbytes += len(pngs[filter_name])
+
+    return {
+        "results": results,
+        "stats": stats,
+        "pngs": pngs,
+        "timings": list(timer.stages),
+    }
+
+
+def run_batch_image_job(path: str, noise_type: str, salt_prob: float, pepper_prob: float, gaussian_sigma: float,
+                        filter_names: List[str], seed: Optional[int] = None, deadline: Optional[float] = None,
+                        timings: bool = False) -> Tuple[Dict, list]:
+    # Uma imagem de um job em lote (/api/jobs): lida do disco no próprio
+    # worker, devolve só as métricas de cada filtro (sem imagens nem PNGs)
+    processor = _processor or ImageProcessor()
+    timer = StageTimer() if timings else NO_TIMER
+    check_deadline(deadline)
+
+    with timer.stage("decode") as stage:
+        with open(path, "rb") as f:
+            content = f.read()
+        original = processor.load_image_from_bytes(content)
+        stage.nbytes = original.nbytes
+
+    cache_key = processor.noise_cache_key(original, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed)
+    noisy = processor.add_noise(original, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed, cache_key,
+                                timer=timer)
+    results = processor.apply_filters(filter_names, original, noisy,
+                                      progress_callback=lambda *_: check_deadline(deadline),
+                                      cache_key=cache_key, timer=timer)
+    metrics = {filter_name: {metric: data[metric] for metric in ("mse", "psnr", "ssim")}
+               for filter_name, data in results.items()}
+    return metrics, list(timer.stages)
+
+
+def run_preview_level_job(level: np.ndarray, noise_type: str, salt_prob: float, pepper_prob: float,
+                          gaussian_sigma: float, seed: Optional[int] = None, deadline: Optional[float] = None,
+                          filter_names: Optional[List[str]] = None) -> Dict:
+    # Um nível reduzido do modo progressivo: métricas aproximadas e os PNGs
+    # (pequenos) da ruidosa e de cada filtro
+    processor = _processor or ImageProcessor()
+    check_deadline(deadline)
+    noisy, results = processor.process_level(level, noise_type, salt_prob, pepper_prob, gaussian_sigma, seed,
+                                             filter_names)
+    check_deadline(deadline)
+    return {
+        "noisy": processor.encode_png(noisy),
+        "filters": {
+            filter_name: {
+                "png": processor.encode_png(data['image']),
+                "mse": data['mse'],
+                "psnr": data['psnr'],
+                "ssim": data['ssim'],
+            }
+            for filter_name, data in results.items()
+        },
+    }